@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark del escáner de reproductores de bota6.
+
+Compara la extracción anterior (dos recorridos por los <script>, re.findall sin
+compilar y corte con find("];")) con escanear_reproductores, que hace una sola
+pasada con patrones precompilados.
+
+Uso:
+    python bench_escaner.py pagina1.html pagina2.html ...
+    python bench_escaner.py            # genera una página sintética grande
+"""
+import random
+import re
+import sys
+import timeit
+
+from bota6 import escanear_reproductores
+
+REPETICIONES = 50
+
+def escaner_anterior(scripts):
+    """Reproduce la extracción original: un recorrido para video[] y otro para var servers"""
+    videos = []
+    for script_text in scripts:
+        videos.extend(re.findall(r'video\[(\d+)\]\s*=\s*\'<iframe[^>]*src="([^"]+)"', script_text))
+
+    bloques_servers = []
+    for script_text in scripts:
+        if "var servers = [" in script_text:
+            inicio = script_text.find("var servers = ") + len("var servers = ")
+            fin = script_text.find("];", inicio) + 1
+            bloques_servers.append(script_text[inicio:fin])
+    return videos, bloques_servers
+
+def generar_relleno_js(tamano, aleatorio):
+    """Genera texto parecido a JavaScript minificado del tamaño indicado"""
+    palabras = ["function", "return", "this", "var", "video", "servers", "length", "null", "typeof",
+                "jQuery", "prototype", "call", "document", "window", "if", "else", "for", "push"]
+    separadores = ["(", ")", "{", "}", ";", ".", ",", "=", "[", "]", " ", "e", "t"]
+    partes = []
+    total = 0
+    while total < tamano:
+        trozo = aleatorio.choice(palabras) + aleatorio.choice(separadores)
+        partes.append(trozo)
+        total += len(trozo)
+    return "".join(partes)
+
+def generar_pagina_sintetica(num_scripts=400, tamano_script=5000):
+    """Genera una página de episodio grande con muchos scripts de relleno"""
+    aleatorio = random.Random(0)
+    partes = ["<html><head><meta property='og:image' content='https://cdn.jkanime.org/a.jpg'></head><body>"]
+    for i in range(num_scripts):
+        partes.append(f"<script>{generar_relleno_js(tamano_script, aleatorio)}</script>")
+    partes.append("<script>var video = [];")
+    for i in range(1, 6):
+        partes.append(f"video[{i}] = '<iframe width=\"640\" src=\"/jk.php?u=stream/{i}.mp4\"></iframe>';")
+    partes.append("</script>")
+    servidores = ", ".join(
+        f'{{"remote":"aHR0cHM6Ly9zZXJ2ZXIte30uY29tL2UvYWJj","server":"Server{i}","lang":1}}'
+        for i in range(20)
+    )
+    partes.append(f"<script>var servers = [{servidores}]; var otro = 1;</script>")
+    partes.append("</body></html>")
+    return "".join(partes)
+
+def medir(nombre, html_pagina):
+    """Mide ambos escáneres sobre una página e imprime el tiempo medio por llamada"""
+    # El navegador entrega los scripts ya separados; el corte no entra en la medición
+    scripts = re.findall(r'<script\b[^>]*>(.*?)</script>', html_pagina, re.DOTALL | re.IGNORECASE)
+    fuente = "\n".join(scripts)
+
+    videos_antes, servers_antes = escaner_anterior(scripts)
+    videos_ahora, servers_ahora = escanear_reproductores(fuente)
+    if videos_antes != videos_ahora or len(servers_antes) != len(servers_ahora):
+        print(f"[AVISO] {nombre}: los resultados no coinciden "
+              f"(video[] {len(videos_antes)} vs {len(videos_ahora)}, servers {len(servers_antes)} vs {len(servers_ahora)})")
+
+    t_antes = timeit.timeit(lambda: escaner_anterior(scripts), number=REPETICIONES) / REPETICIONES
+    t_ahora = timeit.timeit(lambda: escanear_reproductores(fuente), number=REPETICIONES) / REPETICIONES
+
+    print(f"[BENCH] {nombre}: {len(html_pagina) / 1024:.0f} KB, {len(scripts)} scripts")
+    print(f"  - anterior: {t_antes * 1000:.2f} ms")
+    print(f"  - escáner:  {t_ahora * 1000:.2f} ms ({t_antes / t_ahora:.1f}x)")
+
+if __name__ == "__main__":
+    rutas = sys.argv[1:]
+    if not rutas:
+        medir("sintética", generar_pagina_sintetica())
+    for ruta in rutas:
+        with open(ruta, encoding="utf-8", errors="replace") as archivo:
+            medir(ruta, archivo.read())
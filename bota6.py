@@ -5,20 +5,31 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import time
 import re
-import mysql.connector
+from mysql.connector import pooling, errors
 from datetime import datetime
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 import base64
 import json
+from html import unescape
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
-import string
-import random
+import tempfile
 from pathlib import Path
 import traceback
 import sys
+import sqlite3
+import queue
+import threading
+import math
+import hashlib
+import heapq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuración de encoding para la consola de Windows
 if sys.platform == 'win32':
@@ -27,11 +38,264 @@ if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+# Modo de obtención de las páginas de episodio:
+#   "http"   -> descarga el HTML con requests y solo abre Chrome si faltan los reproductores
+#   "chrome" -> carga siempre el episodio en el navegador
+MODO_EPISODIOS = "http"
+
+# Pipeline de importación de extraer_animes_jkanime: hilos por etapa
+#   "detalle"   -> navegadores que abren la ficha del anime y crean su estructura en la BD
+#   "episodios" -> hilos que cargan las páginas de episodio (HTTP, con Chrome de respaldo)
+#   "imagenes"  -> hilos del descargador de imágenes de episodio en segundo plano
+# El descubrimiento usa NUM_HILOS_DIRECTORIO y la persistencia el escritor de la BD.
+# Entre etapas hay colas de TAMANO_COLA_ETAPA elementos; si una se llena, la anterior espera.
+HILOS_POR_ETAPA = {
+    "detalle": 2,
+    "episodios": 6,
+    "imagenes": 4,
+}
+TAMANO_COLA_ETAPA = 100
+
+# Las imágenes de episodio se descargan en segundo plano: el episodio se guarda con la
+# URL original y su still_path pasa a la copia local cuando termina la descarga.
+# Como mucho hay TAMANO_COLA_IMAGENES descargas pendientes; con más, el scraping espera.
+TAMANO_COLA_IMAGENES = 200
+
+# Las imágenes se descargan por bloques de TAMANO_BLOQUE_IMAGEN bytes a un archivo temporal
+# que solo se renombra al destino cuando está completo. Las de más de TAMANO_MAXIMO_IMAGEN
+# bytes se descartan, así la memoria no crece con el número de descargas en paralelo.
+TAMANO_BLOQUE_IMAGEN = 64 * 1024
+TAMANO_MAXIMO_IMAGEN = 10 * 1024 * 1024
+
+# Almacén de imágenes por contenido: cada imagen se guarda una sola vez en
+# RUTA_BASE_IMAGENES/contenido/{h[:2]}/{h}.webp, con h el SHA-256 de sus bytes, y la BD
+# guarda la URL equivalente bajo URL_BASE_IMAGENES. RUTA_INDICE_IMAGENES recuerda el hash
+# de cada URL de origen, así una imagen ya descargada no se vuelve a pedir. Con
+# REVALIDAR_IMAGENES = True se pregunta al servidor con If-None-Match / If-Modified-Since
+# y solo se descargan de nuevo las que cambiaron.
+RUTA_BASE_IMAGENES = Path(r'C:\xampp\htdocs\storage\app\animes')
+URL_BASE_IMAGENES = "https://localhost/storage/app/animes"
+RUTA_INDICE_IMAGENES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bota6_imagenes.sqlite3")
+REVALIDAR_IMAGENES = False
+
+# Conexión a la base de datos
+CONFIG_BD = {
+    "host": "localhost",
+    "user": "root",
+    "password": "",
+    "database": "aruma",  # Cambiar por el nombre real de tu base de datos
+    "connect_timeout": 60  # Aumentar timeout de conexión
+}
+
+# Pool de conexiones compartido por todos los hilos (mysql.connector admite hasta 32).
+# Si todas están en uso, conectar_bd espera hasta TIMEOUT_POOL_BD segundos por una libre.
+TAMANO_POOL_BD = 8
+TIMEOUT_POOL_BD = 300
+
+# Tiempo máximo (segundos) que se espera a que cada tipo de página esté lista.
+# Las esperas terminan en cuanto aparece el contenido necesario.
+TIMEOUT_DETALLE = 15
+TIMEOUT_EPISODIO = 10
+TIMEOUT_DIRECTORIO = 15
+
+# Los slugs existentes se cargan en memoria al arrancar. A partir de este número de
+# animes se usa un filtro de Bloom (con la tasa de falsos positivos indicada) en lugar de un set.
+UMBRAL_FILTRO_BLOOM = 1000000
+TASA_FALSOS_POSITIVOS_BLOOM = 0.001
+
+# Punto de control local (SQLite) con el progreso del rastreo: páginas del directorio
+# ya leídas y estado de cada anime. Permite reanudar tras una caída sin repetir trabajo.
+RUTA_PUNTO_CONTROL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bota6_progreso.sqlite3")
+
+# Número de episodios cuyos videos se escriben juntos en un INSERT multi-fila
+TAMANO_LOTE_EPISODIOS = 50
+
+# Alcance de las transacciones al importar un anime:
+#   "anime" -> un único commit al terminar el anime; cualquier error deshace el anime completo
+#   "grupo" -> el anime, sus temporadas y sus episodios se confirman juntos antes de extraer
+#              los episodios, y los videos se confirman cada TAMANO_GRUPO_COMMIT episodios
+ALCANCE_TRANSACCION = "anime"
+TAMANO_GRUPO_COMMIT = 100
+
+# Escritor asíncrono: los episodios extraídos se dejan en una cola acotada y un hilo
+# dedicado los escribe en la BD en grupos de hasta TAMANO_LOTE_EPISODIOS por commit.
+# Si la cola se llena, el scraping espera a la BD. Con el escritor activo la estructura
+# del anime (temporadas y episodios) se confirma antes de extraer los episodios.
+# El pipeline de extraer_animes_jkanime lo usa siempre; esta opción afecta a insertar_anime_por_slug.
+USAR_ESCRITOR_BD = True
+TAMANO_COLA_ESCRITOR = 200
+
+# Si el escritor pierde la conexión, toma otra del pool y reintenta el grupo (hasta
+# REINTENTOS_ESCRITOR_BD veces por grupo). Mientras MySQL no responda espera sin rendirse;
+# solo al detenerse se da por vencido tras REINTENTOS_ESCRITOR_BD intentos de conexión.
+REINTENTOS_ESCRITOR_BD = 5
+
+# Directorio de JKAnime y número de hilos que descargan sus páginas ?p=N en paralelo.
+# El ritmo real lo sigue marcando el límite por host de jkanime.org.
+URL_DIRECTORIO = "https://jkanime.org/directorio/"
+NUM_HILOS_DIRECTORIO = 8
+
+# Página con los últimos episodios publicados que revisa sondear_ultimos_episodios,
+# y cada cuántos segundos se vuelve a leer
+URL_ULTIMOS_EPISODIOS = "https://jkanime.org/"
+INTERVALO_SONDEO = 300
+
+# Modo demonio: cada cuánto (segundos) se vuelve a revisar un anime según su estado.
+# Los que nunca se revisaron van primero; si una revisión falla se reintenta en
+# INTERVALO_REINTENTO. El directorio se relee cada INTERVALO_DIRECTORIO_DEMONIO.
+INTERVALOS_REVISION = {
+    "emision": 6 * 3600,
+    "estreno": 24 * 3600,
+    "desconocido": 3 * 24 * 3600,
+    "finalizado": 14 * 24 * 3600,
+}
+INTERVALO_REINTENTO = 3600
+INTERVALO_DIRECTORIO_DEMONIO = 24 * 3600
+
+# Límite de peticiones por host: (peticiones por segundo, ráfaga máxima).
+# Se aplica al host exacto o a sus subdominios; "default" cubre el resto (CDNs de imágenes).
+LIMITES_POR_HOST = {
+    "jkanime.org": (1.0, 3),
+    "default": (4.0, 8),
+}
+
+# Retroceso exponencial (segundos) cuando un host responde 429/503 o no responde a tiempo
+BACKOFF_INICIAL = 2.0
+BACKOFF_MAXIMO = 120.0
+
+# Cliente HTTP (requests): cada hilo reutiliza su sesión con conexiones keep-alive.
+#   HTTP_HOSTS_EN_POOL       -> hosts distintos con conexiones guardadas por sesión
+#   HTTP_CONEXIONES_POR_HOST -> conexiones abiertas por host en cada sesión
+#   HTTP_REINTENTOS          -> reintentos ante fallos de conexión y 500/502/504
+#                               (429/503 no se reintentan: los gestiona el limitador)
+#   HTTP_TIMEOUT_CONEXION    -> segundos para establecer la conexión
+HTTP_HOSTS_EN_POOL = 10
+HTTP_CONEXIONES_POR_HOST = 2
+HTTP_REINTENTOS = 2
+HTTP_TIMEOUT_CONEXION = 5
+
+class LimitadorPorHost:
+    """Token bucket por host con retroceso exponencial ante saturación del servidor.
+    
+    Todas las cargas de página y descargas pasan por adquirir() antes de salir,
+    de modo que el ritmo lo marca esta política y no esperas fijas.
+    """
+    
+    def __init__(self, limites, backoff_inicial, backoff_maximo):
+        self.limites = limites
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+        self.cubos = {}
+        self.lock = threading.Lock()
+    
+    def host_de(self, url):
+        """Devuelve el host de una URL sin el prefijo www."""
+        host = (urlparse(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+    
+    def limite_de(self, host):
+        """Busca el límite configurado para el host o alguno de sus dominios padre"""
+        for dominio, limite in self.limites.items():
+            if host == dominio or host.endswith("." + dominio):
+                return limite
+        return self.limites["default"]
+    
+    def obtener_cubo(self, host):
+        """Devuelve el estado del cubo de un host, creándolo lleno si no existe (llamar con el lock)"""
+        if host not in self.cubos:
+            tasa, rafaga = self.limite_de(host)
+            self.cubos[host] = {
+                "tasa": tasa,
+                "rafaga": rafaga,
+                "tokens": float(rafaga),
+                "ultimo": time.monotonic(),
+                "backoff": 0.0,
+                "bloqueado_hasta": 0.0
+            }
+        return self.cubos[host]
+    
+    def adquirir(self, url):
+        """Bloquea hasta que haya un token disponible para el host de la URL"""
+        host = self.host_de(url)
+        while True:
+            with self.lock:
+                cubo = self.obtener_cubo(host)
+                ahora = time.monotonic()
+                cubo["tokens"] = min(cubo["rafaga"], cubo["tokens"] + (ahora - cubo["ultimo"]) * cubo["tasa"])
+                cubo["ultimo"] = ahora
+                
+                espera = cubo["bloqueado_hasta"] - ahora
+                if espera <= 0:
+                    if cubo["tokens"] >= 1:
+                        cubo["tokens"] -= 1
+                        return
+                    espera = (1 - cubo["tokens"]) / cubo["tasa"]
+            time.sleep(espera)
+    
+    def registrar_exito(self, url):
+        """Una respuesta correcta reinicia el retroceso del host"""
+        host = self.host_de(url)
+        with self.lock:
+            self.obtener_cubo(host)["backoff"] = 0.0
+    
+    def registrar_saturacion(self, url, motivo):
+        """Duplica el retroceso del host y lo bloquea durante ese tiempo"""
+        host = self.host_de(url)
+        with self.lock:
+            cubo = self.obtener_cubo(host)
+            cubo["backoff"] = min(self.backoff_maximo, cubo["backoff"] * 2 or self.backoff_inicial)
+            cubo["bloqueado_hasta"] = time.monotonic() + cubo["backoff"]
+            cubo["tokens"] = 0.0
+            backoff = cubo["backoff"]
+        print(f"[LIMITE] {host} saturado ({motivo}). Pausando peticiones {backoff:.1f}s")
+
+limitador = LimitadorPorHost(LIMITES_POR_HOST, BACKOFF_INICIAL, BACKOFF_MAXIMO)
+
+# Códigos HTTP que indican que el servidor nos está limitando
+CODIGOS_SATURACION = (429, 503)
+
+# requests.Session no es segura entre hilos: cada hilo tiene la suya
+sesiones_http = threading.local()
+
+def obtener_sesion_http():
+    """Devuelve la sesión HTTP del hilo actual, creándola la primera vez.
+    
+    La sesión mantiene abiertas las conexiones por host, así que las descargas
+    seguidas al mismo servidor no repiten la conexión TCP ni el handshake TLS.
+    """
+    sesion = getattr(sesiones_http, "sesion", None)
+    if sesion is None:
+        reintentos = Retry(
+            total=HTTP_REINTENTOS,
+            connect=HTTP_REINTENTOS,
+            read=False,  # un timeout de lectura llega al limitador como saturación
+            status=HTTP_REINTENTOS,
+            status_forcelist=(500, 502, 504),
+            backoff_factor=0.5,
+            raise_on_status=False
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=HTTP_HOSTS_EN_POOL,
+            pool_maxsize=HTTP_CONEXIONES_POR_HOST,
+            max_retries=reintentos
+        )
+        sesion = requests.Session()
+        sesion.mount("https://", adaptador)
+        sesion.mount("http://", adaptador)
+        sesion.verify = False
+        sesion.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+            'Referer': 'https://jkanime.org/'
+        })
+        sesiones_http.sesion = sesion
+    return sesion
+
 def verificar_estructura_directorios():
     """Verifica y crea la estructura base de directorios si no existe"""
     try:
         # Definir la ruta base de XAMPP
-        base_path = Path(r'C:\xampp\htdocs\storage\app\animes')
+        base_path = RUTA_BASE_IMAGENES
         print(f"[SETUP] Verificando estructura en: {base_path}")
         
         # Crear la estructura base si no existe
@@ -57,11 +321,6 @@ def obtener_slug(url):
     slug = path.strip('/').split('/')[-1]
     return slug
 
-def generar_nombre_unico(longitud=32):
-    """Genera un nombre único para archivos con caracteres alfanuméricos"""
-    caracteres = string.ascii_letters + string.digits
-    return ''.join(random.choice(caracteres) for _ in range(longitud))
-
 def ajustar_url_imagen(url):
     """Ajusta la URL de la imagen para asegurar que sea absoluta"""
     if not url:
@@ -78,15 +337,162 @@ def ajustar_url_imagen(url):
     # Si no comienza con /, añadir el dominio base completo
     return f"https://jkanime.org/{url}"
 
-def descargar_imagen(url, slug, tipo="poster", episodio=None):
-    """Descarga una imagen y la guarda en la estructura especificada"""
+# Directorios de imágenes ya creados en esta ejecución, para no repetir mkdir en cada descarga
+directorios_creados = set()
+
+def asegurar_directorio(ruta):
+    """Crea el directorio (y sus padres) la primera vez que se pide en esta ejecución"""
+    if ruta in directorios_creados:
+        return
+    ruta.mkdir(parents=True, exist_ok=True)
+    directorios_creados.add(ruta)
+
+def ruta_imagen(hash_imagen):
+    """Ruta en disco de la imagen con ese SHA-256 dentro del almacén por contenido"""
+    return RUTA_BASE_IMAGENES / "contenido" / hash_imagen[:2] / f"{hash_imagen}.webp"
+
+def url_imagen(hash_imagen):
+    """URL que se guarda en la BD para la imagen con ese SHA-256"""
+    return f"{URL_BASE_IMAGENES}/contenido/{hash_imagen[:2]}/{hash_imagen}.webp"
+
+def guardar_por_contenido(response, tamano_maximo=TAMANO_MAXIMO_IMAGEN):
+    """Escribe por bloques el cuerpo de una respuesta con stream=True en el almacén por contenido.
+    
+    Escribe primero en un temporal dentro del almacén mientras calcula el SHA-256 y lo
+    renombra a ruta_imagen(hash) al terminar, así una caída nunca deja un archivo a medias en
+    el destino. Si esos bytes ya estaban guardados, el temporal se borra y se reutiliza el
+    existente. Devuelve (hash, bytes escritos, nueva) y lanza ValueError si el cuerpo supera
+    tamano_maximo (el temporal se borra).
+    """
+    declarado = response.headers.get('content-length')
+    if declarado and declarado.isdigit() and int(declarado) > tamano_maximo:
+        raise ValueError(f"la imagen declara {declarado} bytes (máximo {tamano_maximo})")
+    
+    directorio = RUTA_BASE_IMAGENES / "contenido"
+    asegurar_directorio(directorio)
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, prefix=".descarga.", suffix=".part")
     try:
-        # Ajustar la URL si es necesario
-        url = ajustar_url_imagen(url)
-        if not url:
-            print("[ERROR] URL de imagen inválida")
+        escritos = 0
+        resumen = hashlib.sha256()
+        with os.fdopen(descriptor, 'wb') as f:
+            for bloque in response.iter_content(chunk_size=TAMANO_BLOQUE_IMAGEN):
+                escritos += len(bloque)
+                if escritos > tamano_maximo:
+                    raise ValueError(f"la imagen supera el máximo de {tamano_maximo} bytes")
+                resumen.update(bloque)
+                f.write(bloque)
+        if not escritos:
+            raise ValueError("la respuesta no trae contenido")
+        
+        hash_imagen = resumen.hexdigest()
+        file_path = ruta_imagen(hash_imagen)
+        if file_path.exists():
+            os.remove(ruta_temporal)
+            return hash_imagen, escritos, False
+        asegurar_directorio(file_path.parent)
+        os.replace(ruta_temporal, file_path)
+        return hash_imagen, escritos, True
+    except BaseException:
+        try:
+            os.remove(ruta_temporal)
+        except OSError:
+            pass
+        raise
+
+class IndiceImagenes:
+    """Índice SQLite de las URLs de origen ya descargadas al almacén por contenido.
+    
+    Para cada URL guarda el hash de sus bytes y los validadores de la respuesta (ETag y
+    Last-Modified), así una URL ya vista no se vuelve a descargar en otra ejecución y con
+    REVALIDAR_IMAGENES se puede preguntar al servidor si cambió.
+    """
+    
+    def __init__(self, ruta=RUTA_INDICE_IMAGENES):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(ruta, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS origenes (
+                url TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                actualizado TEXT
+            )
+        """)
+        self.conn.commit()
+        print(f"[DEBUG] Índice de imágenes en {ruta}")
+    
+    def buscar(self, url):
+        """Devuelve {'hash', 'etag', 'last_modified'} de una URL ya descargada o None"""
+        with self.lock:
+            fila = self.conn.execute(
+                "SELECT hash, etag, last_modified FROM origenes WHERE url = ?", (url,)
+            ).fetchone()
+        if fila is None:
             return None
-        
+        return {'hash': fila[0], 'etag': fila[1], 'last_modified': fila[2]}
+    
+    def guardar(self, url, hash_imagen, etag=None, last_modified=None):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO origenes (url, hash, etag, last_modified, actualizado) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET hash = excluded.hash, etag = excluded.etag,
+                    last_modified = excluded.last_modified, actualizado = excluded.actualizado
+            """, (url, hash_imagen, etag, last_modified, now))
+            self.conn.commit()
+
+indice_imagenes = None
+lock_indice_imagenes = threading.Lock()
+
+def obtener_indice_imagenes():
+    """Abre el índice de imágenes la primera vez que se necesita"""
+    global indice_imagenes
+    with lock_indice_imagenes:
+        if indice_imagenes is None:
+            indice_imagenes = IndiceImagenes()
+        return indice_imagenes
+
+# Descargas en marcha por URL de origen: si otro hilo pide la misma, espera a la primera
+descargas_en_curso = {}
+lock_descargas_en_curso = threading.Lock()
+
+def descargar_imagen(url, slug, tipo="poster", episodio=None):
+    """Descarga una imagen al almacén por contenido y devuelve su URL local (None si falla).
+    
+    Las imágenes se guardan por el SHA-256 de sus bytes, así la portada y los episodios que
+    comparten imagen ocupan un solo archivo. Una URL que ya está en el índice no se vuelve a
+    descargar y, si otro hilo ya la está descargando, se espera a ese resultado.
+    slug, tipo y episodio solo sirven para los mensajes.
+    """
+    url = ajustar_url_imagen(url)
+    if not url:
+        print("[ERROR] URL de imagen inválida")
+        return None
+    
+    with lock_descargas_en_curso:
+        en_curso = descargas_en_curso.get(url)
+        propia = en_curso is None
+        if propia:
+            en_curso = descargas_en_curso[url] = {"evento": threading.Event(), "imagen": None}
+    if not propia:
+        print(f"[INFO] {url} ya se está descargando en otro hilo, se espera a esa descarga")
+        en_curso["evento"].wait()
+        return en_curso["imagen"]
+    
+    try:
+        en_curso["imagen"] = descargar_imagen_almacen(url, slug, tipo, episodio)
+        return en_curso["imagen"]
+    finally:
+        with lock_descargas_en_curso:
+            del descargas_en_curso[url]
+        en_curso["evento"].set()
+
+def descargar_imagen_almacen(url, slug, tipo, episodio):
+    """Hace la descarga de descargar_imagen (una sola a la vez por URL)"""
+    try:
         # Mostrar información inicial
         print(f"\n[INICIO DESCARGA] {'='*50}")
         print(f"[INFO] URL a descargar: {url}")
@@ -94,108 +500,135 @@ def descargar_imagen(url, slug, tipo="poster", episodio=None):
         print(f"[INFO] Tipo: {tipo}")
         print(f"[INFO] Episodio: {episodio}")
         
-        # Definir la ruta base de storage correcta (XAMPP htdocs)
-        base_path = Path(r'C:\xampp\htdocs\storage\app\animes')
-        print(f"[INFO] Ruta base: {base_path}")
-        
-        # Crear la estructura de carpetas
-        if tipo == "poster":
-            save_path = base_path / slug
-        else:  # tipo == "chapter" para episodios
-            save_path = base_path / slug / "chapter"
-        
-        print(f"[INFO] Ruta de guardado: {save_path}")
-        
-        # Asegurar que el directorio existe
-        try:
-            save_path.mkdir(parents=True, exist_ok=True)
-            print(f"[SUCCESS] Directorio creado/verificado: {save_path}")
-        except PermissionError:
-            print(f"[ERROR] Error de permisos al crear directorio: {save_path}")
-            return None
-        except Exception as dir_error:
-            print(f"[ERROR] Error al crear directorio: {dir_error}")
-            return None
-        
-        # Verificar que el directorio realmente existe
-        if not save_path.exists():
-            print(f"[ERROR] El directorio no existe después de crear: {save_path}")
-            return None
-        else:
-            print(f"[SUCCESS] Directorio confirmado: {save_path}")
-        
-        # Determinar el nombre del archivo
-        if tipo == "poster":
-            # Generar nombre único para la portada
-            nombre_unico = generar_nombre_unico() + '.webp'
-            file_path = save_path / nombre_unico
-        else:
-            # Para capítulos, usar el número del episodio
-            file_path = save_path / f"{episodio}.webp"
-        
-        print(f"[INFO] Ruta completa del archivo: {file_path}")
+        # Descargar la imagen por la sesión del hilo (User-Agent y Referer ya incluidos)
+        headers = {'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8'}
         
-        # Descargar la imagen con headers para evitar bloqueos
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
-            'Referer': 'https://jkanime.org/'
-        }
+        # Una URL ya descargada cuyo archivo sigue en disco no se vuelve a bajar (o solo si cambió)
+        indice = obtener_indice_imagenes()
+        registro = indice.buscar(url)
+        if registro and ruta_imagen(registro['hash']).exists():
+            if not REVALIDAR_IMAGENES:
+                print(f"[INFO] La imagen ya está en el almacén: {registro['hash']}")
+                print(f"[FIN DESCARGA] {'='*50}\n")
+                return url_imagen(registro['hash'])
+            if registro['etag']:
+                headers['If-None-Match'] = registro['etag']
+            if registro['last_modified']:
+                headers['If-Modified-Since'] = registro['last_modified']
         
         print(f"[INFO] Iniciando descarga HTTP...")
+        limitador.adquirir(url)
         try:
-            response = requests.get(url, headers=headers, timeout=30, verify=False)
+            # stream=True: el cuerpo se lee por bloques al guardarlo, no entero en memoria
+            response = obtener_sesion_http().get(url, headers=headers, timeout=(HTTP_TIMEOUT_CONEXION, 30),
+                                                 stream=True)
             print(f"[INFO] Status code: {response.status_code}")
             print(f"[INFO] Content-Type: {response.headers.get('content-type', 'No especificado')}")
             print(f"[INFO] Content-Length: {response.headers.get('content-length', 'No especificado')} bytes")
         except requests.exceptions.Timeout:
             print(f"[ERROR] Timeout al descargar la imagen")
+            limitador.registrar_saturacion(url, "timeout")
             return None
         except requests.exceptions.RequestException as req_error:
             print(f"[ERROR] Error de request: {req_error}")
             return None
         
-        if response.status_code == 200:
+        with response:
+            if response.status_code in CODIGOS_SATURACION:
+                limitador.registrar_saturacion(url, f"HTTP {response.status_code}")
+            elif response.status_code in (200, 304):
+                limitador.registrar_exito(url)
+            
+            if response.status_code == 304 and registro:
+                print(f"[INFO] La imagen no cambió desde la última descarga: {registro['hash']}")
+                print(f"[FIN DESCARGA] {'='*50}\n")
+                return url_imagen(registro['hash'])
+            
+            if response.status_code != 200:
+                print(f"[ERROR] Error HTTP: Status code {response.status_code}")
+                inicio_respuesta = next(response.iter_content(chunk_size=200), b'')
+                print(f"[ERROR] Respuesta: {inicio_respuesta.decode('utf-8', 'replace') if inicio_respuesta else 'Sin respuesta'}")
+                return None
+            
             try:
-                # Guardar la imagen
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"[SUCCESS] Archivo guardado en: {file_path}")
-                
-                # Verificar que el archivo realmente se creó
-                if file_path.exists():
-                    file_size = file_path.stat().st_size
-                    print(f"[SUCCESS] Archivo confirmado - Tamaño: {file_size} bytes")
-                else:
-                    print(f"[ERROR] El archivo no se guardó correctamente")
-                    return None
-                
-                # Construir la URL completa para la base de datos
-                if tipo == "poster":
-                    url_completa = f"https://localhost/storage/app/animes/{slug}/{nombre_unico}"
+                # Guardar la imagen por bloques y moverla a su sitio ya completa
+                hash_imagen, file_size, nueva = guardar_por_contenido(response)
+                if nueva:
+                    print(f"[SUCCESS] Archivo guardado en: {ruta_imagen(hash_imagen)} - Tamaño: {file_size} bytes")
                 else:
-                    url_completa = f"https://localhost/storage/app/animes/{slug}/chapter/{episodio}.webp"
-                
-                print(f"[SUCCESS] URL para base de datos: {url_completa}")
-                print(f"[FIN DESCARGA] {'='*50}\n")
-                return url_completa
+                    print(f"[INFO] Los mismos bytes ya estaban en el almacén, se reutiliza {hash_imagen}")
+            except ValueError as tamano_error:
+                print(f"[ERROR] Imagen descartada: {tamano_error}")
+                return None
+            except requests.exceptions.RequestException as req_error:
+                print(f"[ERROR] Error al leer la imagen: {req_error}")
+                return None
             except PermissionError:
-                print(f"[ERROR] Error de permisos al escribir archivo: {file_path}")
+                print("[ERROR] Error de permisos al escribir en el almacén de imágenes")
                 return None
             except Exception as file_error:
                 print(f"[ERROR] Error al guardar archivo: {file_error}")
                 return None
-        else:
-            print(f"[ERROR] Error HTTP: Status code {response.status_code}")
-            print(f"[ERROR] Respuesta: {response.text[:200] if response.text else 'Sin respuesta'}")
-            return None
+            
+            indice.guardar(url, hash_imagen, response.headers.get('etag'), response.headers.get('last-modified'))
+        
+        # Construir la URL completa para la base de datos
+        url_completa = url_imagen(hash_imagen)
+        print(f"[SUCCESS] URL para base de datos: {url_completa}")
+        print(f"[FIN DESCARGA] {'='*50}\n")
+        return url_completa
     except Exception as e:
         print(f"[ERROR GENERAL] Error al descargar la imagen {url}: {e}")
         import traceback
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
         return None
 
+class DescargadorImagenes:
+    """Descarga imágenes en segundo plano con un número fijo de hilos.
+    
+    enviar() vuelve enseguida con un Future cuyo resultado es la URL local (None si la
+    descarga falla), así quien extrae los episodios no espera a la red ni al disco.
+    Como mucho hay max_pendientes descargas encoladas o en curso; con más, enviar()
+    espera a que termine alguna, igual que las colas acotadas del pipeline.
+    """
+    def __init__(self, num_hilos=HILOS_POR_ETAPA["imagenes"], max_pendientes=TAMANO_COLA_IMAGENES):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, num_hilos), thread_name_prefix="imagenes")
+        self.cupos = threading.BoundedSemaphore(max_pendientes)
+        self.lock = threading.Lock()
+        self.descargadas = 0
+        self.fallidas = 0
+    
+    def enviar(self, url, slug, tipo="chapter", episodio=None, al_terminar=None):
+        """Encola una descarga; al_terminar(imagen) se llama desde el hilo de descarga si sale bien"""
+        self.cupos.acquire()
+        try:
+            return self.executor.submit(self.descargar, url, slug, tipo, episodio, al_terminar)
+        except Exception:
+            self.cupos.release()
+            raise
+    
+    def descargar(self, url, slug, tipo, episodio, al_terminar):
+        try:
+            imagen = descargar_imagen(url, slug, tipo=tipo, episodio=episodio)
+            with self.lock:
+                if imagen:
+                    self.descargadas += 1
+                else:
+                    self.fallidas += 1
+            if imagen and al_terminar:
+                al_terminar(imagen)
+            return imagen
+        except Exception as e:
+            print(f"[ERROR] Descarga en segundo plano de {url}: {e}")
+            return None
+        finally:
+            self.cupos.release()
+    
+    def cerrar(self):
+        """Espera a que terminen las descargas encoladas y libera los hilos"""
+        self.executor.shutdown(wait=True)
+        print(f"[DEBUG] Descargador de imágenes: {self.descargadas} descargadas, {self.fallidas} fallidas")
+
 def existe_anime_en_bd(cursor, slug):
     """Verifica si el anime ya existe en la base de datos"""
     try:
@@ -209,80 +642,363 @@ def existe_anime_en_bd(cursor, slug):
         print(f"[ERROR] Error al verificar anime en la base de datos: {e}")
         return False  # En caso de error, asumimos que no existe para intentar agregarlo
 
-def extraer_detalle_anime(driver, url, slug):
-    """Extrae los detalles de un anime desde su página individual"""
+class FiltroBloom:
+    """Filtro de Bloom sobre un bytearray para comprobar pertenencia con poca memoria.
+    
+    Puede dar falsos positivos (con la tasa configurada) pero nunca falsos negativos.
+    """
+    
+    def __init__(self, capacidad, tasa_falsos_positivos):
+        capacidad = max(1, capacidad)
+        self.num_bits = max(8, int(-capacidad * math.log(tasa_falsos_positivos) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+    
+    def posiciones(self, valor):
+        """Calcula las posiciones de bit del valor con doble hashing sobre un único blake2b"""
+        digest = hashlib.blake2b(valor.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def agregar(self, valor):
+        for pos in self.posiciones(valor):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+    
+    def __contains__(self, valor):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.posiciones(valor))
+
+class SlugsConocidos:
+    """Slugs de animes ya importados, cargados de una vez al arrancar.
+    
+    Con catálogos pequeños se guardan en un set y la comprobación es exacta. Por
+    encima de UMBRAL_FILTRO_BLOOM se usa un filtro de Bloom y los positivos se
+    confirman contra la BD. La etapa de detalle añade cada slug que inserta.
+    """
+    
+    def __init__(self, cursor):
+        self.lock = threading.Lock()
+        cursor.execute("SELECT COUNT(*) FROM animes")
+        total = cursor.fetchone()[0]
+        
+        if total >= UMBRAL_FILTRO_BLOOM:
+            # Margen para los animes que se inserten durante la ejecución
+            self.slugs = FiltroBloom(total * 2, TASA_FALSOS_POSITIVOS_BLOOM)
+            self.exacto = False
+        else:
+            self.slugs = set()
+            self.exacto = True
+        
+        cursor.execute("SELECT slug FROM animes")
+        for (slug,) in cursor:
+            if self.exacto:
+                self.slugs.add(slug)
+            else:
+                self.slugs.agregar(slug)
+        
+        tipo = "set" if self.exacto else f"filtro de Bloom ({len(self.slugs.bits) // 1024} KB)"
+        print(f"[DEBUG] Cargados {total} slugs existentes en memoria ({tipo})")
+    
+    def contiene(self, slug, cursor):
+        """Indica si el slug ya está en la BD; solo consulta la BD para confirmar positivos del filtro"""
+        with self.lock:
+            presente = slug in self.slugs
+        if presente and not self.exacto:
+            return existe_anime_en_bd(cursor, slug)
+        return presente
+    
+    def agregar(self, slug):
+        with self.lock:
+            if self.exacto:
+                self.slugs.add(slug)
+            else:
+                self.slugs.agregar(slug)
+
+class PuntoControl:
+    """Progreso del rastreo guardado en un SQLite local.
+    
+    Guarda las tarjetas de cada página del directorio ya leída y el estado de cada anime:
+      "pendiente" -> descubierto en el directorio
+      "en_curso"  -> la etapa de detalle empezó a crearlo en la BD
+      "completo"  -> todos sus episodios tienen videos en la BD
+    Un anime "en_curso" tras una caída se reanuda con los episodios que aún no tienen
+    videos (la BD manda). Al terminar un rastreo completo se limpia lo que ya no hace falta.
+    """
+    
+    def __init__(self, ruta=RUTA_PUNTO_CONTROL):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(ruta, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                clave TEXT PRIMARY KEY,
+                valor TEXT
+            );
+            CREATE TABLE IF NOT EXISTS tarjetas_directorio (
+                pagina INTEGER PRIMARY KEY,
+                tarjetas TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS animes (
+                slug TEXT PRIMARY KEY,
+                url TEXT,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                anime_id INTEGER,
+                actualizado TEXT
+            );
+            CREATE TABLE IF NOT EXISTS agenda (
+                slug TEXT PRIMARY KEY,
+                proxima REAL NOT NULL,
+                estado TEXT
+            );
+        """)
+        self.conn.commit()
+        print(f"[DEBUG] Punto de control en {ruta}")
+    
+    def ejecutar(self, query, parametros=()):
+        with self.lock:
+            self.conn.execute(query, parametros)
+            self.conn.commit()
+    
+    def consultar(self, query, parametros=()):
+        with self.lock:
+            return self.conn.execute(query, parametros).fetchall()
+    
+    def obtener_meta(self, clave):
+        filas = self.consultar("SELECT valor FROM meta WHERE clave = ?", (clave,))
+        return filas[0][0] if filas else None
+    
+    def guardar_meta(self, clave, valor):
+        self.ejecutar("INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+    
+    def guardar_pagina(self, pagina, tarjetas):
+        """Marca una página del directorio como leída junto con sus tarjetas"""
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tarjetas_directorio (pagina, tarjetas) VALUES (?, ?)",
+                (pagina, json.dumps(tarjetas))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO animes (slug, url, actualizado) VALUES (?, ?, ?)",
+                [(obtener_slug(tarjeta["url"]), tarjeta["url"], ahora) for tarjeta in tarjetas]
+            )
+            self.conn.commit()
+    
+    def paginas_guardadas(self):
+        """Devuelve {página: [tarjetas]} de las páginas del directorio ya leídas"""
+        return {
+            pagina: json.loads(tarjetas)
+            for pagina, tarjetas in self.consultar("SELECT pagina, tarjetas FROM tarjetas_directorio")
+        }
+    
+    def anime_en_curso(self, slug, url, anime_id=None):
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.ejecutar("""
+            INSERT INTO animes (slug, url, estado, anime_id, actualizado) VALUES (?, ?, 'en_curso', ?, ?)
+            ON CONFLICT(slug) DO UPDATE SET
+                estado = 'en_curso',
+                anime_id = COALESCE(excluded.anime_id, animes.anime_id),
+                actualizado = excluded.actualizado
+        """, (slug, url, anime_id, ahora))
+    
+    def anime_completo(self, anime_id):
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.ejecutar("UPDATE animes SET estado = 'completo', actualizado = ? WHERE anime_id = ?", (ahora, anime_id))
+    
+    def animes_en_curso(self):
+        """Devuelve [(slug, url)] de los animes que quedaron a medias"""
+        return self.consultar("SELECT slug, url FROM animes WHERE estado = 'en_curso' ORDER BY actualizado")
+    
+    def terminar_rastreo(self):
+        """Olvida el directorio leído; solo se conservan los animes aún a medias"""
+        with self.lock:
+            self.conn.execute("DELETE FROM tarjetas_directorio")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("DELETE FROM animes WHERE estado <> 'en_curso'")
+            self.conn.commit()
+        print("[DEBUG] Rastreo completo: punto de control reiniciado")
+    
+    def cargar_agenda(self):
+        """Devuelve [(slug, próxima revisión, estado)] de la agenda del modo demonio"""
+        return self.consultar("SELECT slug, proxima, estado FROM agenda")
+    
+    def guardar_agenda(self, filas):
+        """Guarda [(slug, próxima revisión, estado)] en la agenda"""
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO agenda (slug, proxima, estado) VALUES (?, ?, ?)", filas)
+            self.conn.commit()
+    
+    def cerrar(self):
+        with self.lock:
+            self.conn.close()
+
+# Tiempo acumulado de espera por etapa: {etapa: {"esperas", "total", "maximo", "timeouts"}}
+tiempos_espera = {}
+lock_tiempos_espera = threading.Lock()
+
+def navegar(driver, url):
+    """Carga una URL en el navegador respetando el límite de peticiones del host"""
+    limitador.adquirir(url)
+    try:
+        driver.get(url)
+    except TimeoutException:
+        limitador.registrar_saturacion(url, "timeout de carga")
+        raise
+
+def esperar_condicion(driver, condicion, timeout, etapa):
+    """Espera hasta que se cumpla la condición, como máximo timeout segundos.
+    
+    Devuelve el resultado de la condición o None si se agotó el tiempo.
+    El tiempo esperado se acumula por etapa para reportar_tiempos_espera.
+    Un timeout solo cuenta como saturación del host si la página sigue cargando; si
+    ya terminó de cargar es que el contenido no está (p. ej. un episodio sin
+    reproductores) y no hay por qué frenar al resto de hilos.
+    """
+    inicio = time.monotonic()
+    agotado = False
+    try:
+        resultado = WebDriverWait(driver, timeout, poll_frequency=0.2).until(condicion)
+        limitador.registrar_exito(driver.current_url)
+        return resultado
+    except TimeoutException:
+        agotado = True
+        print(f"[AVISO] Se agotaron los {timeout}s de espera en la etapa '{etapa}'")
+        if pagina_cargada(driver):
+            print("[DEBUG] La página ya había cargado: falta el contenido, no es saturación del host")
+            limitador.registrar_exito(driver.current_url)
+        else:
+            limitador.registrar_saturacion(driver.current_url, f"timeout en {etapa}")
+        return None
+    finally:
+        transcurrido = time.monotonic() - inicio
+        with lock_tiempos_espera:
+            registro = tiempos_espera.setdefault(etapa, {"esperas": 0, "total": 0.0, "maximo": 0.0, "timeouts": 0})
+            registro["esperas"] += 1
+            registro["total"] += transcurrido
+            registro["maximo"] = max(registro["maximo"], transcurrido)
+            if agotado:
+                registro["timeouts"] += 1
+        print(f"[ESPERA] {etapa}: {transcurrido:.2f}s")
+
+def pagina_cargada(driver):
+    """True si el documento actual terminó de cargar (document.readyState == 'complete')"""
+    try:
+        return driver.execute_script("return document.readyState") == "complete"
+    except Exception:
+        return False
+
+def reportar_tiempos_espera():
+    """Imprime el tiempo total, medio y máximo esperado en cada etapa"""
+    with lock_tiempos_espera:
+        if not tiempos_espera:
+            return
+        print("[ESPERA] Resumen de tiempos de espera por etapa:")
+        for etapa, registro in sorted(tiempos_espera.items()):
+            media = registro["total"] / registro["esperas"]
+            print(f"  - {etapa}: {registro['esperas']} esperas, total {registro['total']:.1f}s, "
+                  f"media {media:.2f}s, máximo {registro['maximo']:.2f}s, timeouts {registro['timeouts']}")
+
+def scripts_episodio_listos(driver):
+    """Condición de espera: algún script de la página define video[N] o var servers"""
+    return driver.execute_script("""
+        return Array.prototype.some.call(document.scripts, function (s) {
+            return s.text.indexOf('var servers') !== -1 || /video\\[\\d+\\]\\s*=/.test(s.text);
+        });
+    """)
+
+# Extractor de la página de detalle: devuelve todos los campos en un solo viaje a WebDriver
+JS_EXTRAER_DETALLE = """
+    function texto(selector) {
+        var el = document.querySelector(selector);
+        return el ? el.innerText : null;
+    }
+    function atributo(selector, nombre) {
+        var el = document.querySelector(selector);
+        return el ? el.getAttribute(nombre) : null;
+    }
+    var numeros = document.querySelectorAll('a.numbers');
+    return {
+        title: texto('.anime__details__title h3'),
+        description: texto('p.tab.sinopsis'),
+        og_image: atributo("meta[property='og:image']", 'content'),
+        setbg: atributo('.anime__details__pic.set-bg', 'data-setbg'),
+        trailer_id: atributo('div.animeTrailer', 'data-yt'),
+        ultimo_numero: numeros.length ? numeros[numeros.length - 1].innerText : null
+    };
+"""
+
+def total_episodios_desde_texto(texto):
+    """Obtiene el total de episodios del texto del último enlace a.numbers (por ejemplo: "157 - 167")"""
+    if not texto:
+        return None
+    # Dividir por "-" y obtener el último número
+    partes = texto.split("-")
+    if len(partes) > 1:
+        # Obtener el último número y eliminar espacios
+        total_episodios = partes[1].strip()
+        print(f"[DEBUG] Total de episodios encontrado: {total_episodios}")
+    else:
+        # Si no hay guion, usar el número completo
+        total_episodios = texto.strip()
+        print(f"[DEBUG] Total de episodios encontrado (sin guion): {total_episodios}")
+    return total_episodios
+
+def extraer_detalle_anime(driver, url, slug, descargar_poster=True):
+    """Extrae los detalles de un anime desde su página individual.
+    
+    Con descargar_poster=False no se descarga la portada (al actualizar un anime
+    que ya tiene la suya); 'poster' queda con la URL original.
+    """
     print(f"[DEBUG] Navegando a la URL del anime: {url}")
-    driver.get(url)
-    print(f"[DEBUG] Esperando 5 segundos para que cargue la página...")
-    time.sleep(5)  # Aumentado de 3 a 5 segundos para asegurar carga completa
+    navegar(driver, url)
     
     try:
-        # Extraer título
-        titulo_elemento = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".anime__details__title h3"))
+        # Esperar a que aparezca el título, que indica que la página ya cargó
+        titulo_elemento = esperar_condicion(
+            driver,
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".anime__details__title h3")),
+            TIMEOUT_DETALLE,
+            "detalle"
         )
-        title = titulo_elemento.text
+        if not titulo_elemento:
+            print(f"[ERROR] La página del anime no cargó el título: {url}")
+            return None
         
-        # Extraer descripción
-        descripcion_elemento = driver.find_element(By.CSS_SELECTOR, "p.tab.sinopsis")
-        description = descripcion_elemento.text
+        # Extraer todos los campos de la página con una sola llamada
+        campos = driver.execute_script(JS_EXTRAER_DETALLE)
         
-        # Extraer URL de la imagen desde el meta tag og:image
-        poster_url = None
-        try:
-            meta_imagen = driver.find_element(By.CSS_SELECTOR, "meta[property='og:image']")
-            poster_url = meta_imagen.get_attribute("content")
+        title = campos.get("title")
+        description = campos.get("description")
+        if description is None:
+            print(f"[ERROR] No se encontró la sinopsis (p.tab.sinopsis) en {url}")
+            return None
+        
+        # URL de la imagen desde el meta tag og:image, con fallback a data-setbg
+        poster_url = campos.get("og_image")
+        if poster_url:
             print(f"[DEBUG] URL de imagen de portada encontrada: {poster_url}")
-        except Exception as e:
-            print(f"[DEBUG] Error al obtener imagen desde meta tag: {e}")
-            # Fallback al método anterior
-            try:
-                poster_elemento = driver.find_element(By.CSS_SELECTOR, ".anime__details__pic.set-bg")
-                poster_url = poster_elemento.get_attribute("data-setbg")
+        else:
+            poster_url = campos.get("setbg")
+            if poster_url:
                 print(f"[DEBUG] URL de imagen de portada (fallback): {poster_url}")
-            except Exception as e:
-                print(f"[ERROR] No se pudo encontrar la imagen de portada: {e}")
+            else:
+                print("[ERROR] No se pudo encontrar la imagen de portada")
         
         # Descargar la imagen de portada
         poster_path = None
-        if poster_url:
+        if poster_url and descargar_poster:
             poster_path = descargar_imagen(poster_url, slug, tipo="poster")
         
-        # Extraer ID del trailer de YouTube (si existe)
-        trailer_id = None
-        try:
-            trailer_elemento = driver.find_element(By.CSS_SELECTOR, "div.animeTrailer")
-            if trailer_elemento:
-                trailer_id = trailer_elemento.get_attribute("data-yt")
-                print(f"[DEBUG] ID del trailer encontrado: {trailer_id}")
-        except Exception as e:
-            print(f"[DEBUG] No se encontró trailer o error al extraerlo: {e}")
-            trailer_id = None
+        # ID del trailer de YouTube (si existe)
+        trailer_id = campos.get("trailer_id")
+        if trailer_id:
+            print(f"[DEBUG] ID del trailer encontrado: {trailer_id}")
+        else:
+            print("[DEBUG] No se encontró trailer")
         
-        # Extraer número total de episodios (si existe)
-        total_episodios = None
-        try:
-            # Buscar todos los enlaces de números
-            numeros_elementos = driver.find_elements(By.CSS_SELECTOR, "a.numbers")
-            if numeros_elementos and len(numeros_elementos) > 0:
-                # Obtener el último elemento
-                ultimo_elemento = numeros_elementos[-1]
-                # Extraer el texto (por ejemplo: "157 - 167")
-                texto = ultimo_elemento.text
-                # Dividir por "-" y obtener el último número
-                partes = texto.split("-")
-                if len(partes) > 1:
-                    # Obtener el último número y eliminar espacios
-                    ultimo_numero = partes[1].strip()
-                    total_episodios = ultimo_numero
-                    print(f"[DEBUG] Total de episodios encontrado: {total_episodios}")
-                else:
-                    # Si no hay guion, usar el número completo
-                    total_episodios = texto.strip()
-                    print(f"[DEBUG] Total de episodios encontrado (sin guion): {total_episodios}")
-        except Exception as e:
-            print(f"[DEBUG] No se encontró información de episodios o error al extraerla: {e}")
-            total_episodios = None
+        # Número total de episodios (si existe)
+        total_episodios = total_episodios_desde_texto(campos.get("ultimo_numero"))
         
         return {
             'slug': slug,
@@ -340,93 +1056,276 @@ def es_url_valida(url):
     print(f"[FILTRO] URL ignorada (no cumple criterios): {url}")
     return False
 
+# Escáner de reproductores: una sola pasada sobre el código fuente encuentra tanto
+# video[N] = '<iframe src="...">' como el inicio de var servers = [...]
+PATRON_ESCANER = re.compile(
+    r'video\[(?P<indice>\d+)\]\s*=\s*\'<iframe[^>]*src="(?P<src>[^"]+)"'
+    r'|var\s+servers\s*=\s*(?=\[)'
+)
+# Caracteres relevantes para emparejar corchetes; los escapes se consumen de dos en dos
+PATRON_JSON_ESPECIALES = re.compile(r'\\.|["\'\[\]{}]', re.DOTALL)
+
+def extraer_json_balanceado(texto, inicio):
+    """Devuelve el literal [...] o {...} que empieza en texto[inicio] emparejando corchetes.
+    
+    Ignora los corchetes que aparecen dentro de cadenas. Devuelve None si el literal no se cierra.
+    """
+    nivel = 0
+    en_cadena = None
+    for coincidencia in PATRON_JSON_ESPECIALES.finditer(texto, inicio):
+        token = coincidencia.group()
+        if token[0] == "\\":
+            continue
+        if en_cadena:
+            if token == en_cadena:
+                en_cadena = None
+        elif token in "\"'":
+            en_cadena = token
+        elif token in "[{":
+            nivel += 1
+        else:
+            nivel -= 1
+            if nivel == 0:
+                return texto[inicio:coincidencia.end()]
+    return None
+
+def escanear_reproductores(texto):
+    """Recorre el código fuente una sola vez buscando reproductores.
+    
+    Devuelve (videos, bloques_servers): los pares (indice, src) de video[N] y el
+    texto JSON de cada array var servers encontrado.
+    """
+    videos = []
+    bloques_servers = []
+    for coincidencia in PATRON_ESCANER.finditer(texto):
+        if coincidencia.group("indice") is not None:
+            videos.append((coincidencia.group("indice"), coincidencia.group("src")))
+        else:
+            bloque = extraer_json_balanceado(texto, coincidencia.end())
+            if bloque:
+                bloques_servers.append(bloque)
+    return videos, bloques_servers
+
+def procesar_reproductores_video(videos, numero_episodio):
+    """Convierte los pares (indice, src) de video[N] en reproductores"""
+    reproductores = []
+    
+    for i, src in videos:
+        # Procesar la URL del reproductor
+        if src.startswith("/"):
+            # Si es una ruta relativa, convertirla a absoluta
+            if src.startswith("/jk.php"):
+                # Reproductor especial /jk.php
+                url_completa = f"https://jkanime.org{src}"
+                print(f"[DEBUG] Reproductor JK encontrado: {url_completa}")
+                print(f"[🔗 REPRODUCTOR-JK] EP{numero_episodio} - Video[{i}]: {url_completa}")
+                
+                domain = "jkanime.org"
+                reproductores.append({
+                    "url": url_completa,
+                    "tipo": "jk",
+                    "nombre": f"Server JK {i}",
+                    "domain": domain,
+                    "indice": int(i)  # Guardar el índice para ordenar después
+                })
+            elif src.startswith("/um.php") or src.startswith("/umv.php"):
+                # Reproductor um.php o umv.php
+                url_completa = f"https://jkanime.org{src}"
+                print(f"[DEBUG] Reproductor UM/UMV encontrado: {url_completa}")
+                print(f"[🔗 REPRODUCTOR-UM] EP{numero_episodio} - Video[{i}]: {url_completa}")
+                
+                domain = "jkanime.org"
+                reproductores.append({
+                    "url": url_completa,
+                    "tipo": "um",
+                    "nombre": f"Server {i}",
+                    "domain": domain,
+                    "indice": int(i)  # Guardar el índice para ordenar después
+                })
+        else:
+            # URL completa externa
+            if es_url_valida(src):
+                print(f"[DEBUG] Reproductor externo: {src}")
+                print(f"[🔗 REPRODUCTOR-EXT] EP{numero_episodio} - Video[{i}]: {src}")
+                
+                domain = f"{urlparse(src).scheme}://{urlparse(src).netloc}"
+                reproductores.append({
+                    "url": src,
+                    "tipo": "externo",
+                    "nombre": f"Server {i}",
+                    "domain": domain,
+                    "indice": int(i)  # Guardar el índice para ordenar después
+                })
+    
+    return reproductores
+
+def procesar_servidores_base64(json_texto, numero_episodio):
+    """Decodifica los servidores en base64 del array JSON de 'var servers'"""
+    servidores_b64 = []
+    print("[DEBUG] Encontrados servidores en base64")
+    
+    try:
+        # Parsear el JSON
+        servidores = json.loads(json_texto)
+        print(f"[DEBUG] Se encontraron {len(servidores)} servidores en base64")
+        
+        # Procesar cada servidor
+        for servidor in servidores:
+            remote_b64 = servidor.get("remote")
+            server_name = servidor.get("server")
+            
+            # Decodificar la URL para todos los servidores, incluido Mediafire
+            if remote_b64:
+                url_decodificada = decodificar_base64(remote_b64)
+                if url_decodificada and es_url_valida(url_decodificada):
+                    print(f"[DEBUG] Servidor {server_name}: {url_decodificada}")
+                    print(f"[🔗 REPRODUCTOR-B64] EP{numero_episodio} - {server_name}: {url_decodificada}")
+                    
+                    # Guardar el dominio base para usar como header
+                    parsed_url = urlparse(url_decodificada)
+                    base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+                    
+                    servidores_b64.append({
+                        "url": url_decodificada,
+                        "tipo": "base64",
+                        "nombre": server_name,
+                        "domain": base_domain
+                    })
+    except json.JSONDecodeError as je:
+        print(f"[ERROR] Error al parsear JSON de servidores: {je}")
+    except Exception as ex:
+        print(f"[ERROR] Error general al procesar servidores en base64: {ex}")
+    
+    return servidores_b64
+
+def descargar_html(url, timeout=20):
+    """Descarga el HTML crudo de una página con un cliente HTTP, sin pasar por el navegador"""
+    headers = {'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'}
+    limitador.adquirir(url)
+    try:
+        response = obtener_sesion_http().get(url, headers=headers, timeout=(HTTP_TIMEOUT_CONEXION, timeout))
+    except requests.exceptions.Timeout:
+        print(f"[DEBUG] Timeout al descargar {url}")
+        limitador.registrar_saturacion(url, "timeout")
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"[DEBUG] Error HTTP al descargar {url}: {e}")
+        return None
+    
+    if response.status_code in CODIGOS_SATURACION:
+        limitador.registrar_saturacion(url, f"HTTP {response.status_code}")
+    if response.status_code != 200:
+        print(f"[DEBUG] Status code {response.status_code} al descargar {url}")
+        return None
+    
+    limitador.registrar_exito(url)
+    return response.text
+
+# Patrones para leer el HTML crudo de un episodio
+PATRON_META = re.compile(r'<meta\b[^>]*>', re.IGNORECASE)
+PATRON_OG_IMAGE = re.compile(r'property\s*=\s*["\']og:image["\']', re.IGNORECASE)
+PATRON_CONTENT = re.compile(r'content\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+PATRON_SCRIPT_COMPLETO = re.compile(r'<script\b[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
+PATRON_IFRAME_SRC = re.compile(r'<iframe\b[^>]*\bsrc\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+def extraer_og_image_de_html(html_pagina):
+    """Busca el contenido del meta tag og:image en un HTML crudo"""
+    for tag in PATRON_META.findall(html_pagina):
+        if PATRON_OG_IMAGE.search(tag):
+            contenido = PATRON_CONTENT.search(tag)
+            if contenido:
+                return unescape(contenido.group(1))
+    return None
+
+def obtener_pagina_episodio_http(url_episodio):
+    """Obtiene imagen, reproductores e iframes de un episodio por HTTP.
+    
+    Devuelve None si el HTML no contiene los marcadores de reproductores
+    (video[N] o var servers), en cuyo caso hay que usar Chrome.
+    """
+    html_pagina = descargar_html(url_episodio)
+    if not html_pagina:
+        return None
+    
+    videos, bloques_servers = escanear_reproductores(html_pagina)
+    if not videos and not bloques_servers:
+        print(f"[DEBUG] El HTML de {url_episodio} no contiene reproductores, se usará Chrome")
+        return None
+    
+    # Los iframes dentro de los scripts ya se procesan como video[], solo interesan los del DOM
+    html_sin_scripts = PATRON_SCRIPT_COMPLETO.sub('', html_pagina)
+    iframes = [unescape(src) for src in PATRON_IFRAME_SRC.findall(html_sin_scripts)]
+    
+    print(f"[DEBUG] Episodio obtenido por HTTP: {url_episodio}")
+    return {
+        "og_image": extraer_og_image_de_html(html_pagina),
+        "videos": videos,
+        "servidores": bloques_servers,
+        "iframes": iframes
+    }
+
+# Extractor de la página de episodio: imagen, texto de los scripts e iframes en un solo viaje
+JS_EXTRAER_EPISODIO = """
+    var meta = document.querySelector("meta[property='og:image']");
+    return {
+        og_image: meta ? meta.getAttribute('content') : null,
+        scripts: Array.prototype.map.call(document.scripts, function (s) { return s.innerHTML; }).join('\\n'),
+        iframes: Array.prototype.map.call(document.querySelectorAll('iframe'), function (f) { return f.src; })
+            .filter(function (src) { return !!src; })
+    };
+"""
+
+def obtener_pagina_episodio_chrome(driver, url_episodio):
+    """Obtiene imagen, reproductores e iframes de un episodio cargándolo en Chrome"""
+    # Navegar a la página del episodio
+    navegar(driver, url_episodio)
+    
+    # Esperar a que los scripts con los reproductores estén presentes
+    esperar_condicion(driver, scripts_episodio_listos, TIMEOUT_EPISODIO, "episodio")
+    
+    try:
+        pagina = driver.execute_script(JS_EXTRAER_EPISODIO)
+    except Exception as e:
+        print(f"[ERROR] Error al leer la página del episodio: {e}")
+        pagina = {}
+    
+    videos, bloques_servers = escanear_reproductores(pagina.get("scripts") or "")
+    return {
+        "og_image": pagina.get("og_image"),
+        "videos": videos,
+        "servidores": bloques_servers,
+        "iframes": pagina.get("iframes") or []
+    }
+
 def extraer_datos_episodio(driver, url_base, numero_episodio, episode_id, slug):
-    """Extrae los datos de un episodio específico"""
+    """Extrae los datos de un episodio específico.
+    
+    La imagen no se descarga aquí: "imagen" queda con la URL original y "imagen_origen"
+    indica qué descargar, cosa que quien llama deja al DescargadorImagenes.
+    """
     try:
         # Construir URL del episodio
         url_episodio = f"{url_base}/{numero_episodio}/"
         print(f"[DEBUG] Navegando a episodio: {url_episodio}")
         print(f"[🔗 URL] EPISODIO {numero_episodio}: {url_episodio}")  # URLs destacadas para visualizar
         
-        # Navegar a la página del episodio
-        driver.get(url_episodio)
-        time.sleep(3)  # Esperar a que cargue la página
+        # Intentar primero con HTTP plano y recurrir a Chrome solo si hace falta
+        pagina = None
+        if MODO_EPISODIOS == "http":
+            pagina = obtener_pagina_episodio_http(url_episodio)
+        if pagina is None:
+            pagina = obtener_pagina_episodio_chrome(driver, url_episodio)
         
         # Extraer imagen del episodio desde meta tag og:image
-        imagen_episodio = None
-        imagen_descargada = None
-        
-        try:
-            meta_imagen = driver.find_element(By.CSS_SELECTOR, "meta[property='og:image']")
-            if meta_imagen:
-                imagen_episodio = meta_imagen.get_attribute("content")
-                print(f"[DEBUG] Imagen del episodio encontrada: {imagen_episodio}")
-                
-                # Descargar la imagen del episodio
-                imagen_descargada = descargar_imagen(imagen_episodio, slug, tipo="chapter", episodio=numero_episodio)
-        except Exception as e:
-            print(f"[DEBUG] No se encontró imagen del episodio: {e}")
-            
-        # Inicializar todos los reproductores
-        todos_reproductores = []
+        imagen_episodio = pagina["og_image"]
+        if imagen_episodio:
+            print(f"[DEBUG] Imagen del episodio encontrada: {imagen_episodio}")
         
         # 1. Extraer reproductores de video[] array - PRIORIDAD 1
         reproductores_video_array = []
         try:
-            # Buscar reproductores en scripts con formato video[X]
-            scripts = driver.find_elements(By.TAG_NAME, "script")
-            for script in scripts:
-                script_text = script.get_attribute("innerHTML")
-                
-                # Buscar patrones como video[1], video[2], video[3], etc.
-                video_patterns = re.findall(r'video\[(\d+)\]\s*=\s*\'<iframe[^>]*src="([^"]+)"', script_text)
-                
-                for i, src in video_patterns:
-                    # Procesar la URL del reproductor
-                    if src.startswith("/"):
-                        # Si es una ruta relativa, convertirla a absoluta
-                        if src.startswith("/jk.php"):
-                            # Reproductor especial /jk.php
-                            url_completa = f"https://jkanime.org{src}"
-                            print(f"[DEBUG] Reproductor JK encontrado: {url_completa}")
-                            print(f"[🔗 REPRODUCTOR-JK] EP{numero_episodio} - Video[{i}]: {url_completa}")
-                            
-                            domain = "jkanime.org"
-                            reproductores_video_array.append({
-                                "url": url_completa,
-                                "tipo": "jk",
-                                "nombre": f"Server JK {i}",
-                                "domain": domain,
-                                "indice": int(i)  # Guardar el índice para ordenar después
-                            })
-                        elif src.startswith("/um.php") or src.startswith("/umv.php"):
-                            # Reproductor um.php o umv.php
-                            url_completa = f"https://jkanime.org{src}"
-                            print(f"[DEBUG] Reproductor UM/UMV encontrado: {url_completa}")
-                            print(f"[🔗 REPRODUCTOR-UM] EP{numero_episodio} - Video[{i}]: {url_completa}")
-                            
-                            domain = "jkanime.org"
-                            reproductores_video_array.append({
-                                "url": url_completa,
-                                "tipo": "um",
-                                "nombre": f"Server {i}",
-                                "domain": domain,
-                                "indice": int(i)  # Guardar el índice para ordenar después
-                            })
-                    else:
-                        # URL completa externa
-                        if es_url_valida(src):
-                            print(f"[DEBUG] Reproductor externo: {src}")
-                            print(f"[🔗 REPRODUCTOR-EXT] EP{numero_episodio} - Video[{i}]: {src}")
-                            
-                            domain = f"{urlparse(src).scheme}://{urlparse(src).netloc}"
-                            reproductores_video_array.append({
-                                "url": src,
-                                "tipo": "externo",
-                                "nombre": f"Server {i}",
-                                "domain": domain,
-                                "indice": int(i)  # Guardar el índice para ordenar después
-                            })
+            # Reproductores con formato video[X] encontrados por el escáner
+            reproductores_video_array = procesar_reproductores_video(pagina["videos"], numero_episodio)
             
             # Ordenar por índice para mantener el mismo orden que en la página
             reproductores_video_array.sort(key=lambda x: x["indice"])
@@ -439,50 +1338,9 @@ def extraer_datos_episodio(driver, url_base, numero_episodio, episode_id, slug):
         # 2. Extraer servidores codificados en base64 - PRIORIDAD 2
         servidores_b64 = []
         try:
-            # Buscar la parte del script que contiene los servidores en base64
-            scripts = driver.find_elements(By.TAG_NAME, "script")
-            for script in scripts:
-                script_text = script.get_attribute("innerHTML")
-                if "var servers = [" in script_text:
-                    print("[DEBUG] Encontrados servidores en base64")
-                    
-                    # Extraer el array JSON de servidores
-                    try:
-                        # Encontrar el inicio del array JSON
-                        inicio = script_text.find("var servers = ") + len("var servers = ")
-                        fin = script_text.find("];", inicio) + 1
-                        if inicio > 0 and fin > 0:
-                            json_texto = script_text[inicio:fin]
-                            # Parsear el JSON
-                            servidores = json.loads(json_texto)
-                            print(f"[DEBUG] Se encontraron {len(servidores)} servidores en base64")
-                            
-                            # Procesar cada servidor
-                            for servidor in servidores:
-                                remote_b64 = servidor.get("remote")
-                                server_name = servidor.get("server")
-                                
-                                # Decodificar la URL para todos los servidores, incluido Mediafire
-                                if remote_b64:
-                                    url_decodificada = decodificar_base64(remote_b64)
-                                    if url_decodificada and es_url_valida(url_decodificada):
-                                        print(f"[DEBUG] Servidor {server_name}: {url_decodificada}")
-                                        print(f"[🔗 REPRODUCTOR-B64] EP{numero_episodio} - {server_name}: {url_decodificada}")
-                                        
-                                        # Guardar el dominio base para usar como header
-                                        parsed_url = urlparse(url_decodificada)
-                                        base_domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                                        
-                                        servidores_b64.append({
-                                            "url": url_decodificada,
-                                            "tipo": "base64",
-                                            "nombre": server_name,
-                                            "domain": base_domain
-                                        })
-                    except json.JSONDecodeError as je:
-                        print(f"[ERROR] Error al parsear JSON de servidores: {je}")
-                    except Exception as ex:
-                        print(f"[ERROR] Error general al procesar servidores en base64: {ex}")
+            # Arrays JSON de var servers encontrados por el escáner
+            for json_texto in pagina["servidores"]:
+                servidores_b64.extend(procesar_servidores_base64(json_texto, numero_episodio))
         except Exception as e:
             print(f"[ERROR] Error al buscar servidores en base64: {e}")
         
@@ -505,10 +1363,8 @@ def extraer_datos_episodio(driver, url_base, numero_episodio, episode_id, slug):
         # 3. Si hay pocos reproductores, buscar alternativas
         if len(servidores_ordenados) < 2:
             try:
-                # Método alternativo: Buscar elementos iframe directamente
-                iframes = driver.find_elements(By.TAG_NAME, "iframe")
-                for iframe in iframes:
-                    src = iframe.get_attribute("src")
+                # Método alternativo: usar los iframes presentes en la página
+                for src in pagina["iframes"]:
                     if src and es_url_valida(src):
                         # Verificar que no esté ya incluido
                         if not any(r["url"] == src for r in servidores_ordenados):
@@ -540,61 +1396,102 @@ def extraer_datos_episodio(driver, url_base, numero_episodio, episode_id, slug):
         print(f"[DEBUG] Total de reproductores finales: {len(servidores_ordenados)}")
         
         return {
-            "imagen": imagen_descargada if imagen_descargada else imagen_episodio,
+            "imagen": imagen_episodio,
+            "imagen_origen": imagen_episodio,
             "reproductores": servidores_ordenados
         }
     except Exception as e:
         print(f"[ERROR] Error al extraer datos del episodio {numero_episodio}: {e}")
         return {
             "imagen": None,
+            "imagen_origen": None,
             "reproductores": []
         }
 
-def insertar_videos_episodio(conn, cursor, episodio_id, datos_episodio):
-    """Inserta los videos de un episodio en la base de datos"""
-    try:
-        # Si hay imagen del episodio, actualizar el episodio
-        if datos_episodio and datos_episodio.get('imagen'):
-            print(f"[DEBUG] Actualizando imagen del episodio ID {episodio_id}: {datos_episodio['imagen']}")
-            query_update = """
-            UPDATE anime_episodes 
-            SET still_path = %s, still_path_tv = %s 
-            WHERE id = %s
-            """
-            values_update = (
-                datos_episodio['imagen'],
-                datos_episodio['imagen'],
-                episodio_id
-            )
-            cursor.execute(query_update, values_update)
-            conn.commit()
-            print(f"[DEBUG] Actualizada imagen del episodio ID {episodio_id}")
-        
-        # Verificar si hay reproductores
-        if not datos_episodio or 'reproductores' not in datos_episodio or not datos_episodio['reproductores']:
-            print(f"[DEBUG] No hay reproductores para el episodio ID {episodio_id}")
-            return False
-        
-        # Insertar cada reproductor
-        for i, reproductor in enumerate(datos_episodio['reproductores']):
-            reproductor_url = reproductor["url"]
-            tipo = reproductor.get("tipo", "principal")
-            domain = reproductor.get("domain", "https://jkanime.org")
-            
-            # Asignar nombre del servidor según el índice o el tipo
-            if "nombre" in reproductor:
-                server = reproductor["nombre"]
-            elif i == 0:
-                server = "1080P"
-            elif i == 1:
-                server = "720P"
-            else:
-                server = f"Servidor {i+1}"
-            
-            print(f"[DEBUG] Insertando reproductor {server} para episodio ID {episodio_id}: {reproductor_url}")
-            print(f"[DEBUG] Header (dominio): {domain}")
-            print(f"[✅ INSERTADO] Reproductor {server} para episodio ID {episodio_id}")
-            
+def filas_videos_episodio(episodio_id, datos_episodio):
+    """Construye las filas de anime_videos para los reproductores de un episodio"""
+    filas = []
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    for i, reproductor in enumerate(datos_episodio['reproductores']):
+        reproductor_url = reproductor["url"]
+        tipo = reproductor.get("tipo", "principal")
+        domain = reproductor.get("domain", "https://jkanime.org")
+        
+        # Asignar nombre del servidor según el índice o el tipo
+        if "nombre" in reproductor:
+            server = reproductor["nombre"]
+        elif i == 0:
+            server = "1080P"
+        elif i == 1:
+            server = "720P"
+        else:
+            server = f"Servidor {i+1}"
+        
+        print(f"[DEBUG] Reproductor {server} para episodio ID {episodio_id}: {reproductor_url}")
+        print(f"[DEBUG] Header (dominio): {domain}")
+        
+        filas.append((
+            episodio_id,                # anime_episode_id
+            server,                     # server
+            domain,                     # header (usando el dominio base)
+            None,                       # useragent
+            reproductor_url,            # link
+            "Spanish",                  # lang
+            None,                       # video_name
+            0,                          # embed (0 para todos según el ejemplo)
+            0,                          # youtubelink
+            0,                          # hls (0 para primer reproductor, 1 para el segundo)
+            1,                          # supported_hosts
+            0,                          # drm
+            None,                       # drmuuid
+            None,                       # drmlicenceuri
+            1,                          # status
+            now,                        # created_at
+            now                         # updated_at
+        ))
+    
+    return filas
+
+def actualizar_imagenes_episodios(cursor, imagenes):
+    """Cambia la imagen (still_path y still_path_tv) de varios episodios con un solo executemany.
+    
+    imagenes es una lista de (episodio_id, imagen). No confirma la transacción.
+    """
+    if not imagenes:
+        return
+    query_update = """
+    UPDATE anime_episodes 
+    SET still_path = %s, still_path_tv = %s 
+    WHERE id = %s
+    """
+    cursor.executemany(query_update, [(imagen, imagen, episodio_id) for episodio_id, imagen in imagenes])
+    print(f"[DEBUG] Actualizadas {len(imagenes)} imágenes de episodio")
+
+def insertar_videos_episodios(cursor, lote):
+    """Inserta en bloque las imágenes y los videos de un lote de episodios.
+    
+    lote es una lista de (episodio_id, datos_episodio). Las imágenes se actualizan
+    con un solo executemany y todos los reproductores van en un INSERT multi-fila.
+    No confirma la transacción: el commit lo decide quien llama.
+    """
+    try:
+        # Si hay imagen del episodio, actualizar el episodio
+        actualizar_imagenes_episodios(cursor, [
+            (episodio_id, datos['imagen'])
+            for episodio_id, datos in lote
+            if datos and datos.get('imagen')
+        ])
+        
+        filas_videos = []
+        for episodio_id, datos in lote:
+            # Verificar si hay reproductores
+            if not datos or not datos.get('reproductores'):
+                print(f"[DEBUG] No hay reproductores para el episodio ID {episodio_id}")
+                continue
+            filas_videos.extend(filas_videos_episodio(episodio_id, datos))
+        
+        if filas_videos:
             # Consulta SQL que incluye todos los campos requeridos
             query = """
             INSERT INTO anime_videos 
@@ -602,227 +1499,688 @@ def insertar_videos_episodio(conn, cursor, episodio_id, datos_episodio):
             youtubelink, hls, supported_hosts, drm, drmuuid, drmlicenceuri, status, created_at, updated_at) 
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
-            
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            values = (
-                episodio_id,                # anime_episode_id
-                server,                     # server
-                domain,                     # header (usando el dominio base)
-                None,                       # useragent
-                reproductor_url,            # link
-                "Spanish",                  # lang
-                None,                       # video_name
-                0,                          # embed (0 para todos según el ejemplo)
-                0,                          # youtubelink
-                0,                          # hls (0 para primer reproductor, 1 para el segundo)
-                1,                          # supported_hosts
-                0,                          # drm
-                None,                       # drmuuid
-                None,                       # drmlicenceuri
-                1,                          # status
-                now,                        # created_at
-                now                         # updated_at
-            )
-            
+            # executemany agrupa todas las filas en un único INSERT multi-fila
+            cursor.executemany(query, filas_videos)
+        
+        print(f"[✅ INSERTADO] {len(filas_videos)} reproductores para {len(lote)} episodios")
+    except Exception as e:
+        print(f"[ERROR] Error al insertar videos para los episodios {[episodio_id for episodio_id, _ in lote]}: {e}")
+        raise
+
+class EscritorBD:
+    """Hilo dedicado que escribe en la BD los episodios extraídos.
+    
+    Los scrapers dejan (episodio_id, datos_episodio) en una cola acotada y siguen con el
+    siguiente episodio; el escritor agrupa lo que haya en la cola y lo confirma con un
+    solo commit. Si la BD va más lenta que el scraping la cola se llena y encolar()
+    bloquea, así el scraping se ajusta al ritmo de la BD. Las imágenes descargadas en
+    segundo plano llegan aparte con encolar_imagen() y van en el mismo commit.
+    Una caída de MySQL no detiene el hilo: reconecta y vuelve a intentar el grupo.
+    """
+    def __init__(self, tamano_cola=TAMANO_COLA_ESCRITOR, tamano_grupo=TAMANO_LOTE_EPISODIOS, al_confirmar=None):
+        self.cola = queue.Queue(maxsize=tamano_cola)
+        self.tamano_grupo = tamano_grupo
+        self.al_confirmar = al_confirmar
+        self.hilo = threading.Thread(target=self.ejecutar, name="escritor-bd", daemon=True)
+        self.conn = None
+        self.cursor = None
+        self.episodios_escritos = 0
+        self.errores = 0
+    
+    def iniciar(self):
+        self.hilo.start()
+    
+    def entregar(self, item):
+        """Deja un elemento en la cola; falla si el hilo escritor ya no está vivo"""
+        while True:
+            if not self.hilo.is_alive():
+                raise RuntimeError("El escritor de la BD no está activo")
             try:
-                cursor.execute(query, values)
-                # Verificar que la inserción tuvo éxito
-                lastid = cursor.lastrowid
-                print(f"[DEBUG] Reproductor insertado con ID: {lastid}")
+                self.cola.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+    
+    def encolar(self, episodio_id, datos_episodio):
+        """Bloquea mientras la cola esté llena (backpressure)"""
+        self.entregar((episodio_id, datos_episodio))
+    
+    def encolar_imagen(self, episodio_id, imagen):
+        """Cambia la imagen de un episodio ya encolado; no cuenta como episodio escrito.
+        
+        Al ir por la misma cola se escribe siempre después del episodio, que lleva la URL original.
+        """
+        self.entregar(("imagen", episodio_id, imagen))
+    
+    def sincronizar(self):
+        """Espera a que todo lo encolado hasta ahora esté confirmado en la BD"""
+        evento = threading.Event()
+        self.entregar(evento)
+        while not evento.wait(1.0):
+            if not self.hilo.is_alive():
+                raise RuntimeError("El escritor de la BD terminó antes de confirmar los episodios")
+    
+    def detener(self):
+        """Escribe lo pendiente y termina el hilo"""
+        try:
+            self.entregar(None)
+        except RuntimeError:
+            pass
+        self.hilo.join()
+        print(f"[DEBUG] Escritor BD: {self.episodios_escritos} episodios escritos, {self.errores} con error")
+    
+    def ejecutar(self):
+        grupo = []
+        try:
+            try:
+                self.reconectar()
+                while True:
+                    try:
+                        # Con un grupo a medias, si la cola se queda quieta se escribe lo que haya
+                        item = self.cola.get(timeout=1.0 if grupo else None)
+                    except queue.Empty:
+                        grupo = self.escribir_grupo(grupo)
+                        continue
+                    
+                    if item is None:
+                        break
+                    if isinstance(item, threading.Event):
+                        grupo = self.escribir_grupo(grupo)
+                        item.set()
+                        continue
+                    
+                    grupo.append(item)
+                    if len(grupo) >= self.tamano_grupo:
+                        grupo = self.escribir_grupo(grupo)
+            except Exception as e:
+                print(f"[ERROR] Escritor BD detenido: {e}")
+                print(f"[ERROR] Traceback: {traceback.format_exc()}")
+            finally:
+                # Al salir ya no se espera indefinidamente a que vuelva la BD
+                try:
+                    self.escribir_grupo(grupo, intentos_conexion=REINTENTOS_ESCRITOR_BD)
+                except Exception as e:
+                    print(f"[ERROR] Escritor BD: no se pudieron escribir los últimos {len(grupo)} elementos: {e}")
+        finally:
+            devolver_conexion(self.conn, self.cursor)
+            self.conn = self.cursor = None
+    
+    def reconectar(self, intentos=None):
+        """Devuelve la conexión actual al pool y toma otra, esperando mientras MySQL no responda.
+        
+        Con intentos=None no se rinde nunca; si no, lanza la última excepción al agotarlos.
+        """
+        espera = BACKOFF_INICIAL
+        intento = 0
+        while True:
+            devolver_conexion(self.conn, self.cursor)
+            self.conn = self.cursor = None
+            try:
+                self.conn = conectar_bd()
+                self.cursor = self.conn.cursor()
+                return
             except Exception as e:
-                print(f"[ERROR] Error al insertar reproductor {i+1}: {e}")
-                print(f"[ERROR] Consulta: {query}")
-                print(f"[ERROR] Valores: {values}")
+                intento += 1
+                if intentos is not None and intento >= intentos:
+                    raise
+                print(f"[AVISO] Escritor BD: sin conexión a la BD ({e}), reintento en {espera:.0f}s")
+                time.sleep(espera)
+                espera = min(espera * 2, BACKOFF_MAXIMO)
+    
+    def deshacer(self):
+        """Rollback que no falla aunque la conexión se haya caído"""
+        try:
+            if self.conn:
+                self.conn.rollback()
+        except Exception as e:
+            print(f"[DEBUG] Escritor BD: rollback fallido ({e})")
+    
+    def escribir_y_confirmar(self, grupo, intentos_conexion=None):
+        """Escribe y confirma un grupo; ante un error de conexión reconecta y lo repite.
         
-        conn.commit()
-        print(f"[DEBUG] Insertados {len(datos_episodio['reproductores'])} reproductores para el episodio ID {episodio_id}")
-        return True
-    except Exception as e:
-        print(f"[ERROR] Error al insertar videos para el episodio {episodio_id}: {e}")
-        conn.rollback()
-        return False
+        Los errores de los datos (o una conexión que falla REINTENTOS_ESCRITOR_BD veces
+        seguidas con el mismo grupo) se propagan tras deshacer la transacción.
+        """
+        fallos = 0
+        while True:
+            try:
+                if self.conn is None:
+                    self.reconectar(intentos_conexion)
+                self.conn.ping(reconnect=True, attempts=3, delay=1)
+                self.escribir(self.cursor, grupo)
+                self.conn.commit()
+                return
+            except (errors.OperationalError, errors.InterfaceError) as e:
+                self.deshacer()
+                fallos += 1
+                if fallos > REINTENTOS_ESCRITOR_BD:
+                    raise
+                print(f"[AVISO] Escritor BD: conexión perdida ({e}); se reconecta y se repite el grupo")
+                self.reconectar(intentos_conexion)
+            except Exception:
+                self.deshacer()
+                raise
+    
+    def escribir_grupo(self, grupo, intentos_conexion=None):
+        """Escribe y confirma un grupo; si falla, reintenta episodio a episodio"""
+        if not grupo:
+            return []
+        try:
+            self.escribir_y_confirmar(grupo, intentos_conexion)
+            print(f"[DEBUG] Escritor BD: confirmados {len(grupo)} episodios")
+            self.confirmados(grupo)
+            return []
+        except Exception as e:
+            print(f"[ERROR] Escritor BD: falló el grupo de {len(grupo)} episodios: {e}")
+        if self.conn is None:
+            # No hay forma de llegar a la BD: el grupo entero se pierde
+            self.descartados(grupo)
+            return []
+        
+        # Aislar los episodios problemáticos para no perder el resto del grupo
+        for item in grupo:
+            try:
+                self.escribir_y_confirmar([item], intentos_conexion)
+            except Exception as e:
+                print(f"[ERROR] Escritor BD: descartado el episodio ID {item[-2]}: {e}")
+                self.descartados([item])
+                continue
+            self.confirmados([item])
+        return []
+    
+    @staticmethod
+    def separar(grupo):
+        """Divide un grupo en (episodios, imágenes sueltas de encolar_imagen)"""
+        episodios = [item for item in grupo if item[0] != "imagen"]
+        imagenes = [item[1:] for item in grupo if item[0] == "imagen"]
+        return episodios, imagenes
+    
+    def escribir(self, cursor, grupo):
+        episodios, imagenes = self.separar(grupo)
+        if episodios:
+            insertar_videos_episodios(cursor, episodios)
+        actualizar_imagenes_episodios(cursor, imagenes)
+    
+    def confirmados(self, grupo):
+        """Cuenta los episodios ya confirmados y avisa a al_confirmar"""
+        episodios, _ = self.separar(grupo)
+        if not episodios:
+            return
+        self.episodios_escritos += len(episodios)
+        if self.al_confirmar:
+            try:
+                self.al_confirmar(episodios)
+            except Exception as e:
+                print(f"[ERROR] Escritor BD: error en al_confirmar: {e}")
+    
+    def descartados(self, grupo):
+        """Cuenta los episodios que no se pudieron escribir y avisa a al_confirmar sin datos.
+        
+        Así quien los sigue (el pipeline) los saca de los episodios en marcha igual que a un
+        episodio cuya extracción falló, y se pueden volver a encolar.
+        """
+        episodios, _ = self.separar(grupo)
+        if not episodios:
+            return
+        self.errores += len(episodios)
+        if self.al_confirmar:
+            try:
+                self.al_confirmar([(episodio_id, None) for episodio_id, _ in episodios])
+            except Exception as e:
+                print(f"[ERROR] Escritor BD: error en al_confirmar: {e}")
 
-def insertar_temporadas_episodios(conn, cursor, anime_id, total_episodios, slug):
-    """Inserta las temporadas y episodios para un anime"""
+def crear_estructura_anime(cursor, contexto_anime, desde=1):
+    """Inserta las temporadas y los episodios (sin videos) de un anime.
+    
+    Crea los episodios desde el número absoluto `desde` hasta el total del contexto,
+    con las temporadas de 12 que falten; con desde > 1 completa un anime existente.
+    Devuelve {número absoluto de episodio: id} de los episodios creados o None si el
+    total de episodios no es válido. No confirma la transacción.
+    """
     try:
+        anime_id = contexto_anime['id']
+        total_episodios = contexto_anime['total_episodios']
+        
         if not total_episodios or not total_episodios.isdigit():
             print(f"[DEBUG] No hay total de episodios o no es un número válido: {total_episodios}")
-            return False
+            return None
         
         total_eps = int(total_episodios)
-        print(f"[DEBUG] Creando temporadas y episodios para anime ID {anime_id}, total episodios: {total_eps}")
+        if desde > total_eps:
+            return {}
+        print(f"[DEBUG] Creando episodios {desde}-{total_eps} para anime ID {anime_id}")
         
         # Calcular número de temporadas (cada 12 episodios)
         num_temporadas = (total_eps + 11) // 12  # Redondeo hacia arriba
-        print(f"[DEBUG] Se crearán {num_temporadas} temporadas")
         
-        # Construir la URL base para los episodios
-        url_base = f"https://jkanime.org/{slug}"
+        # Un anime nuevo no tiene temporadas; uno que se completa puede tener casi todas
+        temporadas_ids = {}
+        if desde > 1:
+            cursor.execute("SELECT id, season_number FROM anime_seasons WHERE anime_id = %s", (anime_id,))
+            temporadas_ids = {season_number: temporada_id for temporada_id, season_number in cursor.fetchall()}
+        temporadas_nuevas = [
+            temp_num for temp_num in range((desde - 1) // 12 + 1, num_temporadas + 1)
+            if temp_num not in temporadas_ids
+        ]
+        print(f"[DEBUG] Se crearán {len(temporadas_nuevas)} temporadas")
+        
+        # URL base para los episodios
+        url_base = contexto_anime['url_base']
         print(f"[🔗 URL BASE] ANIME: {url_base}")  # URL destacada
         
-        for temp_num in range(1, num_temporadas + 1):
-            # Insertar temporada
-            query_temporada = """
-            INSERT INTO anime_seasons 
-            (anime_id, season_number, name, created_at, updated_at) 
-            VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            values_temporada = (
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # 1. Insertar todas las temporadas con un solo INSERT multi-fila
+        query_temporada = """
+        INSERT INTO anime_seasons 
+        (anime_id, season_number, name, created_at, updated_at) 
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        filas_temporadas = [
+            (
                 anime_id,                        # anime_id
                 temp_num,                        # season_number
                 f"Temporada {temp_num}",         # name
                 now,                             # created_at
                 now                              # updated_at
             )
+            for temp_num in temporadas_nuevas
+        ]
+        if filas_temporadas:
+            cursor.executemany(query_temporada, filas_temporadas)
             
-            print(f"[DEBUG] Insertando temporada {temp_num}")
-            cursor.execute(query_temporada, values_temporada)
-            conn.commit()
-            
-            # Obtener el ID de la temporada recién insertada
-            temporada_id = cursor.lastrowid
-            print(f"[DEBUG] Temporada insertada con ID: {temporada_id}")
-            print(f"[✅ INSERTADO] Temporada {temp_num} con ID: {temporada_id}")  # Confirmación
-            
-            # Calcular episodios para esta temporada
+            # Recuperar los IDs autoincrementales de las temporadas por número
+            cursor.execute("SELECT id, season_number FROM anime_seasons WHERE anime_id = %s", (anime_id,))
+            temporadas_ids = {season_number: temporada_id for temporada_id, season_number in cursor.fetchall()}
+            print(f"[✅ INSERTADO] {len(filas_temporadas)} temporadas para anime ID {anime_id}")
+        
+        # Usar la imagen del anime como still_path
+        imagen = contexto_anime['poster']
+        
+        # 2. Insertar todos los episodios con un solo INSERT multi-fila
+        query_episodio = """
+        INSERT INTO anime_episodes 
+        (anime_season_id, episode_number, name, enable_stream, enable_media_download, 
+        still_path, still_path_tv, created_at, updated_at) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        filas_episodios = []
+        for ep_num in range(desde, total_eps + 1):
+            temp_num = (ep_num - 1) // 12 + 1
             primer_episodio = (temp_num - 1) * 12 + 1
-            ultimo_episodio = min(temp_num * 12, total_eps)
-            
-            print(f"[DEBUG] Insertando episodios del {primer_episodio} al {ultimo_episodio} para temporada {temp_num}")
-            
-            # Insertar episodios
-            episodios_ids = {}  # Diccionario para guardar {num_episodio: episodio_id}
-            
-            for ep_num in range(primer_episodio, ultimo_episodio + 1):
-                query_episodio = """
-                INSERT INTO anime_episodes 
-                (anime_season_id, episode_number, name, enable_stream, enable_media_download, 
-                still_path, still_path_tv, created_at, updated_at) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-                
-                # Usar la imagen del anime como still_path
-                query_imagen = "SELECT poster_path FROM animes WHERE id = %s"
-                cursor.execute(query_imagen, (anime_id,))
-                imagen_result = cursor.fetchone()
-                imagen = imagen_result[0] if imagen_result else None
-                
-                values_episodio = (
-                    temporada_id,                # anime_season_id
-                    ep_num - primer_episodio + 1,# episode_number (relativo a la temporada)
-                    f"Capitulo {ep_num}",        # name
-                    1,                           # enable_stream
-                    1,                           # enable_media_download
-                    imagen,                      # still_path
-                    imagen,                      # still_path_tv
-                    now,                         # created_at
-                    now                          # updated_at
-                )
-                
-                cursor.execute(query_episodio, values_episodio)
-                conn.commit()
-                
-                # Guardar el ID del episodio recién insertado
-                episodio_id = cursor.lastrowid
-                episodios_ids[ep_num] = episodio_id
-                print(f"[✅ INSERTADO] Episodio {ep_num} con ID: {episodio_id}")  # Confirmación
-                
-                # Extraer datos del episodio (imagen y reproductores)
-                datos_episodio = extraer_datos_episodio(driver, url_base, ep_num, episodio_id, slug)
-                
-                # Insertar videos del episodio
-                if datos_episodio:
-                    insertar_videos_episodio(conn, cursor, episodio_id, datos_episodio)
-                
-                # Esperar un tiempo entre cada episodio para no sobrecargar el servidor
-                print(f"[DEBUG] Esperando 2 segundos antes de procesar el siguiente episodio...")
-                time.sleep(2)
-            
-            print(f"[DEBUG] Episodios insertados correctamente para temporada {temp_num}")
-        
-        return True
+            filas_episodios.append((
+                temporadas_ids[temp_num],    # anime_season_id
+                ep_num - primer_episodio + 1,# episode_number (relativo a la temporada)
+                f"Capitulo {ep_num}",        # name
+                1,                           # enable_stream
+                1,                           # enable_media_download
+                imagen,                      # still_path
+                imagen,                      # still_path_tv
+                now,                         # created_at
+                now                          # updated_at
+            ))
+        cursor.executemany(query_episodio, filas_episodios)
+        
+        # Recuperar los IDs de los episodios y mapearlos al número absoluto de episodio
+        episodios_ids = obtener_ids_episodios(cursor, anime_id)
+        if desde > 1:
+            episodios_ids = {ep_num: episodios_ids[ep_num] for ep_num in range(desde, total_eps + 1)}
+        print(f"[✅ INSERTADO] {len(episodios_ids)} episodios para anime ID {anime_id}")
+        return episodios_ids
     except Exception as e:
-        print(f"[ERROR] Error al insertar temporadas y episodios: {e}")
-        conn.rollback()
-        return False
+        print(f"[ERROR] Error al crear temporadas y episodios: {e}")
+        raise
 
-def insertar_anime_en_bd(conn, cursor, datos_anime):
-    """Inserta un nuevo anime en la base de datos"""
+def insertar_temporadas_episodios(conn, cursor, contexto_anime, driver, escritor=None):
+    """Inserta las temporadas y episodios para un anime.
+    
+    contexto_anime lleva en memoria los datos del anime recién insertado (id, slug,
+    poster, total de episodios), así que no hace falta volver a leerlos de la BD.
+    Los errores se propagan para que insertar_anime_en_bd deshaga la transacción.
+    Solo confirma por su cuenta en el alcance "grupo" o si hay escritor: en ese caso
+    los videos de cada episodio se encolan en el EscritorBD, que usa su propia conexión.
+    """
     try:
-        # Imprimir los datos que se van a insertar para depuración
-        print("[DEBUG] Datos a insertar en la BD:")
-        print(f"  - Título: {datos_anime['title']}")
-        print(f"  - Descripción: {datos_anime['description'][:30]}...")
-        print(f"  - ID Trailer: {datos_anime.get('trailer_id', 'NO HAY')}")
-        
-        query = """
-        INSERT INTO animes (
-            name, original_name, slug, overview, poster_path, backdrop_path_tv, 
-            backdrop_path, is_anime, active, created_at, updated_at, preview_path
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
+        anime_id = contexto_anime['id']
         
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        episodios_ids = crear_estructura_anime(cursor, contexto_anime)
+        if episodios_ids is None:
+            return False
         
-        # Obtener el número de episodios para ponerlo en el título si está disponible
-        nombre_con_episodios = datos_anime['title']
-        if datos_anime.get('total_episodios'):
-            nombre_con_episodios = f"{datos_anime['title']} [{datos_anime.get('total_episodios')} Eps]"
+        if ALCANCE_TRANSACCION == "grupo" or escritor:
+            # El anime con todas sus temporadas y episodios se confirma de una vez
+            # (el escritor necesita ver los episodios desde su conexión)
+            conn.commit()
+            print(f"[DEBUG] Confirmada la estructura del anime ID {anime_id}")
         
-        # Asegurarse de que el trailer_id no sea None
-        trailer_id = datos_anime.get('trailer_id', '')
-        if trailer_id is None:
-            trailer_id = ''
+        extraer_videos_episodios(conn, cursor, contexto_anime, episodios_ids, driver, escritor)
+        print(f"[DEBUG] Episodios insertados correctamente para anime ID {anime_id}")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Error al insertar temporadas y episodios: {e}")
+        raise
+
+def extraer_videos_episodios(conn, cursor, contexto_anime, episodios_ids, driver, escritor=None):
+    """Extrae los episodios indicados ({número: id}) e inserta sus videos en lotes.
+    
+    Sin escritor, confirma por su cuenta solo en el alcance "grupo"; con escritor
+    entrega cada episodio al EscritorBD y espera a que estén todos confirmados.
+    Las imágenes se descargan en segundo plano mientras se extraen los episodios
+    siguientes y su still_path se actualiza al final con las que se descargaron.
+    """
+    slug = contexto_anime['slug']
+    url_base = contexto_anime['url_base']
+    numeros = sorted(episodios_ids)
+    
+    descargador = DescargadorImagenes()
+    descargas = {}
+    try:
+        lote = []
+        sin_confirmar = 0
+        for ep_num in numeros:
+            episodio_id = episodios_ids[ep_num]
+            ultimo = ep_num == numeros[-1]
             
-        print(f"[DEBUG] ID del trailer que se va a guardar: '{trailer_id}'")
-        
-        values = (
-            datos_anime['title'],                # name (con número de episodios)
-            datos_anime['title'],                # original_name
-            datos_anime['slug'],                 # slug
-            datos_anime['description'],          # overview
-            datos_anime['poster'],               # poster_path
-            datos_anime['poster'],               # backdrop_path_tv
-            datos_anime['poster'],               # backdrop_path
-            1,                                   # is_anime
-            1,                                   # active
-            now,                                 # created_at
-            now,                                 # updated_at
-            trailer_id                           # preview_path (ID del trailer de YouTube)
-        )
-        
-        print(f"[DEBUG] Ejecutando insert en la base de datos para '{datos_anime['title']}'")
-        cursor.execute(query, values)
-        
-        # Verificar que la inserción tuvo éxito
-        lastid = cursor.lastrowid
-        
-        # Consultar el registro recién insertado para verificar
-        verify_query = "SELECT preview_path FROM animes WHERE id = %s"
-        cursor.execute(verify_query, (lastid,))
-        result = cursor.fetchone()
-        
-        if result:
-            print(f"[DEBUG] Verificación: preview_path guardado = '{result[0]}'")
-        
+            # Extraer datos del episodio (reproductores); la imagen se descarga aparte
+            datos_episodio = extraer_datos_episodio(driver, url_base, ep_num, episodio_id, slug)
+            if datos_episodio.get("imagen_origen"):
+                descargas[episodio_id] = descargador.enviar(datos_episodio["imagen_origen"], slug,
+                                                            tipo="chapter", episodio=ep_num)
+            if escritor:
+                # La escritura se solapa con la carga del siguiente episodio
+                escritor.encolar(episodio_id, datos_episodio)
+                continue
+            lote.append((episodio_id, datos_episodio))
+            
+            if len(lote) >= TAMANO_LOTE_EPISODIOS or ultimo:
+                insertar_videos_episodios(cursor, lote)
+                sin_confirmar += len(lote)
+                lote = []
+                
+                if ALCANCE_TRANSACCION == "grupo" and (sin_confirmar >= TAMANO_GRUPO_COMMIT or ultimo):
+                    conn.commit()
+                    print(f"[DEBUG] Confirmados {sin_confirmar} episodios (hasta el {ep_num})")
+                    sin_confirmar = 0
+    finally:
+        descargador.cerrar()
+    
+    # Todas las descargas han terminado: las que salieron bien sustituyen a la URL original
+    imagenes = [(episodio_id, futuro.result()) for episodio_id, futuro in descargas.items()]
+    imagenes = [(episodio_id, imagen) for episodio_id, imagen in imagenes if imagen]
+    if escritor:
+        for episodio_id, imagen in imagenes:
+            escritor.encolar_imagen(episodio_id, imagen)
+        escritor.sincronizar()
+    elif imagenes:
+        actualizar_imagenes_episodios(cursor, imagenes)
+        if ALCANCE_TRANSACCION == "grupo":
+            conn.commit()
+
+def obtener_ids_episodios(cursor, anime_id):
+    """Devuelve {número absoluto de episodio: id} de un anime a partir de sus temporadas de 12"""
+    cursor.execute("""
+        SELECT e.id, s.season_number, e.episode_number
+        FROM anime_episodes e
+        JOIN anime_seasons s ON s.id = e.anime_season_id
+        WHERE s.anime_id = %s
+    """, (anime_id,))
+    return {
+        (season_number - 1) * 12 + episode_number: episodio_id
+        for episodio_id, season_number, episode_number in cursor.fetchall()
+    }
+
+def contar_episodios_por_slug(cursor):
+    """Devuelve {slug: número de episodios} de todo el catálogo con una sola consulta agrupada"""
+    cursor.execute("""
+        SELECT a.slug, COUNT(e.id)
+        FROM animes a
+        LEFT JOIN anime_seasons s ON s.anime_id = a.id
+        LEFT JOIN anime_episodes e ON e.anime_season_id = s.id
+        GROUP BY a.id, a.slug
+    """)
+    return {slug: total for slug, total in cursor.fetchall()}
+
+def obtener_episodios_sin_videos(cursor, anime_id):
+    """Devuelve {número absoluto de episodio: id} de los episodios del anime que aún no tienen videos"""
+    cursor.execute("""
+        SELECT e.id, s.season_number, e.episode_number
+        FROM anime_episodes e
+        JOIN anime_seasons s ON s.id = e.anime_season_id
+        WHERE s.anime_id = %s
+          AND NOT EXISTS (SELECT 1 FROM anime_videos v WHERE v.anime_episode_id = e.id)
+    """, (anime_id,))
+    return {
+        (season_number - 1) * 12 + episode_number: episodio_id
+        for episodio_id, season_number, episode_number in cursor.fetchall()
+    }
+
+def obtener_anime_por_slug(cursor, slug):
+    """Reconstruye el contexto de un anime ya insertado a partir de su slug (None si no está)"""
+    cursor.execute("SELECT id, name, poster_path FROM animes WHERE slug = %s", (slug,))
+    fila = cursor.fetchone()
+    if not fila:
+        return None
+    anime_id, titulo, poster = fila
+    return {
+        'id': anime_id,
+        'slug': slug,
+        'title': titulo,
+        'poster': poster,
+        'total_episodios': None,
+        'url_base': f"https://jkanime.org/{slug}"
+    }
+
+def actualizar_estructura_anime(conn, cursor, contexto_anime, total_sitio):
+    """Crea los episodios que el sitio tiene y la BD no, y devuelve los que faltan por extraer.
+    
+    Compara el total de a.numbers con el último episodio guardado y crea los nuevos
+    completando la última temporada y abriendo las siguientes (12 por temporada). Lo
+    confirma y devuelve {número: id} de todos los episodios sin videos, que incluye
+    los recién creados y los que una ejecución anterior dejara a medias.
+    """
+    anime_id = contexto_anime['id']
+    ultimo_bd = max(obtener_ids_episodios(cursor, anime_id), default=0)
+    
+    if total_sitio and str(total_sitio).isdigit() and int(total_sitio) > ultimo_bd:
+        print(f"[🆕 NUEVOS] {contexto_anime['slug']}: {ultimo_bd} episodios en la BD, {total_sitio} en el sitio")
+        contexto_anime['total_episodios'] = str(total_sitio)
+        crear_estructura_anime(cursor, contexto_anime, desde=ultimo_bd + 1)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute("UPDATE animes SET updated_at = %s WHERE id = %s", (now, anime_id))
         conn.commit()
-        print(f"[DEBUG] Anime '{datos_anime['title']}' insertado correctamente con ID: {lastid}")
-        print(f"[✅ INSERTADO] ANIME: {datos_anime['title']} (ID: {lastid}, Slug: {datos_anime['slug']})")  # Confirmación
+    else:
+        print(f"[DEBUG] {contexto_anime['slug']} está al día ({ultimo_bd} episodios)")
+    
+    return obtener_episodios_sin_videos(cursor, anime_id)
+
+def insertar_fila_anime(cursor, datos_anime):
+    """Inserta la fila del anime y devuelve su contexto en memoria. No confirma."""
+    # Imprimir los datos que se van a insertar para depuración
+    print("[DEBUG] Datos a insertar en la BD:")
+    print(f"  - Título: {datos_anime['title']}")
+    print(f"  - Descripción: {datos_anime['description'][:30]}...")
+    print(f"  - ID Trailer: {datos_anime.get('trailer_id', 'NO HAY')}")
+    
+    query = """
+    INSERT INTO animes (
+        name, original_name, slug, overview, poster_path, backdrop_path_tv, 
+        backdrop_path, is_anime, active, created_at, updated_at, preview_path
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Obtener el número de episodios para ponerlo en el título si está disponible
+    nombre_con_episodios = datos_anime['title']
+    if datos_anime.get('total_episodios'):
+        nombre_con_episodios = f"{datos_anime['title']} [{datos_anime.get('total_episodios')} Eps]"
+    
+    # Asegurarse de que el trailer_id no sea None
+    trailer_id = datos_anime.get('trailer_id', '')
+    if trailer_id is None:
+        trailer_id = ''
+        
+    print(f"[DEBUG] ID del trailer que se va a guardar: '{trailer_id}'")
+    
+    values = (
+        datos_anime['title'],                # name (con número de episodios)
+        datos_anime['title'],                # original_name
+        datos_anime['slug'],                 # slug
+        datos_anime['description'],          # overview
+        datos_anime['poster'],               # poster_path
+        datos_anime['poster'],               # backdrop_path_tv
+        datos_anime['poster'],               # backdrop_path
+        1,                                   # is_anime
+        1,                                   # active
+        now,                                 # created_at
+        now,                                 # updated_at
+        trailer_id                           # preview_path (ID del trailer de YouTube)
+    )
+    
+    print(f"[DEBUG] Ejecutando insert en la base de datos para '{datos_anime['title']}'")
+    cursor.execute(query, values)
+    
+    # Verificar que la inserción tuvo éxito
+    lastid = cursor.lastrowid
+    print(f"[DEBUG] Anime '{datos_anime['title']}' insertado con ID: {lastid}")
+    
+    # Datos del anime que necesita el resto del pipeline, sin volver a consultarlos
+    contexto_anime = {
+        'id': lastid,
+        'slug': datos_anime['slug'],
+        'title': datos_anime['title'],
+        'poster': datos_anime['poster'],
+        'total_episodios': datos_anime.get('total_episodios'),
+        'url_base': f"https://jkanime.org/{datos_anime['slug']}"
+    }
+    return contexto_anime
+
+def insertar_anime_en_bd(conn, cursor, datos_anime, driver, escritor=None):
+    """Inserta un nuevo anime en la base de datos.
+    
+    Es el dueño de la transacción del anime: confirma al terminar y ante
+    cualquier error hace rollback de todo lo que no se haya confirmado.
+    Con escritor, los videos de los episodios se escriben a través del EscritorBD.
+    """
+    try:
+        contexto_anime = insertar_fila_anime(cursor, datos_anime)
+        lastid = contexto_anime['id']
         
         # Si tiene total de episodios, insertar temporadas y episodios
-        if datos_anime.get('total_episodios'):
+        if contexto_anime['total_episodios']:
             print(f"[DEBUG] Creando temporadas y episodios para anime ID {lastid}")
-            insertar_temporadas_episodios(conn, cursor, lastid, datos_anime.get('total_episodios'), datos_anime['slug'])
+            insertar_temporadas_episodios(conn, cursor, contexto_anime, driver, escritor)
         
+        conn.commit()
+        print(f"[✅ INSERTADO] ANIME: {datos_anime['title']} (ID: {lastid}, Slug: {datos_anime['slug']})")  # Confirmación
         return True
     except Exception as e:
         print(f"[ERROR] Error al insertar anime en la base de datos: {e}")
         conn.rollback()  # Hacer rollback en caso de error
         return False
 
+def crear_anime_en_bd(conn, cursor, datos_anime):
+    """Inserta el anime con sus temporadas y episodios vacíos y lo confirma.
+    
+    Es el paso de BD de la etapa de detalle del pipeline: los videos llegan después
+    por el EscritorBD. Devuelve (contexto_anime, {número de episodio: id}).
+    """
+    try:
+        contexto_anime = insertar_fila_anime(cursor, datos_anime)
+        episodios_ids = crear_estructura_anime(cursor, contexto_anime) or {}
+        conn.commit()
+        print(f"[✅ INSERTADO] ANIME: {datos_anime['title']} (ID: {contexto_anime['id']}, "
+              f"{len(episodios_ids)} episodios por extraer)")
+        return contexto_anime, episodios_ids
+    except Exception:
+        conn.rollback()
+        raise
+
+def crear_driver():
+    """Crea una instancia de Chrome con las opciones del scraper"""
+    chrome_options = Options()
+    # Se quita el modo headless para que el navegador sea visible
+    # chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(options=chrome_options)
+
+pool_bd = None
+lock_pool_bd = threading.Lock()
+
+def obtener_pool_bd():
+    """Crea el pool de conexiones la primera vez que se necesita"""
+    global pool_bd
+    with lock_pool_bd:
+        if pool_bd is None:
+            print(f"[DEBUG] Creando pool de {TAMANO_POOL_BD} conexiones a la base de datos...")
+            pool_bd = pooling.MySQLConnectionPool(
+                pool_name="bota",
+                pool_size=TAMANO_POOL_BD,
+                pool_reset_session=True,
+                **CONFIG_BD
+            )
+    return pool_bd
+
+def conectar_bd():
+    """Toma una conexión del pool, comprobando que sigue viva.
+    
+    Si MySQL la cerró por wait_timeout se reconecta de forma transparente.
+    Al llamar a close() la conexión vuelve al pool.
+    """
+    pool = obtener_pool_bd()
+    inicio = time.monotonic()
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except pooling.PoolError:
+            # Pool agotado: esperar a que otro hilo devuelva una conexión
+            if time.monotonic() - inicio > TIMEOUT_POOL_BD:
+                raise
+            time.sleep(0.2)
+    
+    conn.ping(reconnect=True, attempts=3, delay=1)
+    return conn
+
+def devolver_conexion(conn, cursor):
+    """Cierra el cursor y devuelve la conexión al pool"""
+    if cursor:
+        try:
+            cursor.close()
+        except Exception as e:
+            print(f"[ERROR] Error al cerrar cursor: {e}")
+    if conn:
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"[ERROR] Error al devolver la conexión al pool: {e}")
+
+def cerrar_recursos(conn, cursor, driver):
+    """Cierra el cursor, la conexión a la base de datos y el navegador si existen"""
+    print("[DEBUG] Finalizando proceso, cerrando conexiones...")
+    if cursor:
+        try:
+            cursor.close()
+            print("[DEBUG] Cursor cerrado correctamente")
+        except Exception as e:
+            print(f"[ERROR] Error al cerrar cursor: {e}")
+    
+    if conn:
+        try:
+            conn.close()
+            print("[DEBUG] Conexión a la base de datos cerrada correctamente")
+        except Exception as e:
+            print(f"[ERROR] Error al cerrar conexión a la base de datos: {e}")
+    
+    if driver:
+        try:
+            driver.quit()
+            print("[DEBUG] Navegador cerrado correctamente")
+        except Exception as e:
+            print(f"[ERROR] Error al cerrar el navegador: {e}")
+
 def insertar_anime_por_slug(slug):
     """Inserta un anime específico por su slug"""
     print(f"[INFO] Iniciando proceso para insertar el anime con slug: {slug}")
@@ -830,34 +2188,34 @@ def insertar_anime_por_slug(slug):
     # Configurar la conexión a la base de datos
     conn = None
     cursor = None
+    driver = None
+    escritor = None
     try:
         print("[DEBUG] Intentando conectar a la base de datos...")
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="aruma",  # Cambiar por el nombre real de tu base de datos
-            connect_timeout=60  # Aumentar timeout de conexión
-        )
+        conn = conectar_bd()
         cursor = conn.cursor()
         print("[DEBUG] Conexión a la base de datos establecida correctamente")
         
         # Verificar si el anime ya existe en la base de datos
         if existe_anime_en_bd(cursor, slug):
-            print(f"[AVISO] El anime con slug '{slug}' ya existe en la base de datos.")
-            return False
-        
-        # Configurar opciones de Chrome
-        chrome_options = Options()
-        # Se quita el modo headless para que el navegador sea visible
-        # chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
+            # Si quedó a medias, completar solo los episodios que no tienen videos
+            contexto_anime = obtener_anime_por_slug(cursor, slug)
+            pendientes = obtener_episodios_sin_videos(cursor, contexto_anime['id'])
+            if not pendientes:
+                print(f"[AVISO] El anime con slug '{slug}' ya existe en la base de datos.")
+                return False
+            
+            print(f"[INFO] El anime '{slug}' quedó a medias: reanudando {len(pendientes)} episodios")
+            driver = crear_driver()
+            if USAR_ESCRITOR_BD:
+                escritor = EscritorBD()
+                escritor.iniciar()
+            extraer_videos_episodios(conn, cursor, contexto_anime, pendientes, driver, escritor)
+            conn.commit()
+            return True
         
         # Inicializar el navegador Chrome
-        global driver
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = crear_driver()
         
         # URL del anime
         url = f"https://jkanime.org/{slug}"
@@ -874,7 +2232,10 @@ def insertar_anime_por_slug(slug):
             print(f"  - Total Episodios: {datos_anime.get('total_episodios')}")
             
             # Insertar en la base de datos
-            insertar_anime_en_bd(conn, cursor, datos_anime)
+            if USAR_ESCRITOR_BD:
+                escritor = EscritorBD()
+                escritor.iniciar()
+            insertar_anime_en_bd(conn, cursor, datos_anime, driver, escritor)
             print(f"[INFO] Proceso completado para el anime '{datos_anime['title']}'")
             return True
         else:
@@ -887,222 +2248,1149 @@ def insertar_anime_por_slug(slug):
             conn.rollback()
         return False
     finally:
+        if escritor:
+            escritor.detener()
+        reportar_tiempos_espera()
+        
         # Cerrar conexiones
-        print("[DEBUG] Finalizando proceso, cerrando conexiones...")
-        if cursor:
-            try:
-                cursor.close()
-                print("[DEBUG] Cursor cerrado correctamente")
-            except Exception as e:
-                print(f"[ERROR] Error al cerrar cursor: {e}")
+        cerrar_recursos(conn, cursor, driver)
+        print("[DEBUG] Proceso completado")
+
+def actualizar_anime_por_slug(slug):
+    """Añade a un anime ya importado los episodios nuevos publicados en el sitio.
+    
+    Devuelve el número de episodios extraídos (0 si estaba al día) o None si falla.
+    """
+    print(f"[INFO] Buscando episodios nuevos del anime con slug: {slug}")
+    
+    conn = None
+    cursor = None
+    driver = None
+    escritor = None
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        
+        contexto_anime = obtener_anime_por_slug(cursor, slug)
+        if contexto_anime is None:
+            print(f"[AVISO] El anime con slug '{slug}' no está en la base de datos. Usa insertar_anime_por_slug.")
+            return None
+        
+        driver = crear_driver()
+        datos_anime = extraer_detalle_anime(driver, contexto_anime['url_base'], slug, descargar_poster=False)
+        if not datos_anime:
+            print(f"[ERROR] No se pudieron extraer datos del anime con slug: {slug}")
+            return None
         
+        pendientes = actualizar_estructura_anime(conn, cursor, contexto_anime, datos_anime['total_episodios'])
+        if not pendientes:
+            return 0
+        
+        print(f"[INFO] Extrayendo {len(pendientes)} episodios de '{slug}'")
+        if USAR_ESCRITOR_BD:
+            escritor = EscritorBD()
+            escritor.iniciar()
+        extraer_videos_episodios(conn, cursor, contexto_anime, pendientes, driver, escritor)
+        conn.commit()
+        return len(pendientes)
+    except Exception as e:
+        print(f"[ERROR] Error al actualizar el anime: {e}")
         if conn:
-            try:
-                conn.close()
-                print("[DEBUG] Conexión a la base de datos cerrada correctamente")
-            except Exception as e:
-                print(f"[ERROR] Error al cerrar conexión a la base de datos: {e}")
+            conn.rollback()
+        return None
+    finally:
+        if escritor:
+            escritor.detener()
+        reportar_tiempos_espera()
+        cerrar_recursos(conn, cursor, driver)
+
+# Datos que las tarjetas del directorio pueden mostrar además del enlace:
+# número de episodios ("24 Eps", "Episodios: 24") y estado de emisión
+PATRON_TARJETA = re.compile(r'<div\b[^>]*class="[^"]*\bdir1\b[^"]*"', re.IGNORECASE)
+PATRON_TITULO_TARJETA = re.compile(
+    r'<h5\b[^>]*class="[^"]*card-title[^"]*"[^>]*>\s*<a\b[^>]*href="([^"]+)"', re.IGNORECASE
+)
+PATRON_ETIQUETA_HTML = re.compile(r'<[^>]+>')
+PATRON_EPISODIOS_TARJETA = re.compile(
+    r'(\d+)\s*(?:episodios?|eps?|cap[ií]tulos?|caps?)\b|(?:episodios?|eps?|cap[ií]tulos?|caps?)\s*:?\s*(\d+)',
+    re.IGNORECASE
+)
+ESTADOS_TARJETA = {
+    "emision": re.compile(r'en\s+emisi[oó]n|emitiendo', re.IGNORECASE),
+    "finalizado": re.compile(r'finalizado|concluido|terminado', re.IGNORECASE),
+    "estreno": re.compile(r'por\s+estrenar|pr[oó]ximamente', re.IGNORECASE),
+}
+
+def crear_tarjeta(url, texto):
+    """Arma la tarjeta de un anime del directorio a partir de su URL y su texto visible"""
+    episodios = None
+    coincidencia = PATRON_EPISODIOS_TARJETA.search(texto or "")
+    if coincidencia:
+        episodios = int(coincidencia.group(1) or coincidencia.group(2))
+    estado = next((nombre for nombre, patron in ESTADOS_TARJETA.items() if patron.search(texto or "")), None)
+    return {"url": url, "episodios": episodios, "estado": estado}
+
+def extraer_tarjetas_directorio(driver):
+    """Devuelve en una sola llamada las tarjetas (URL, episodios, estado) del listado actual"""
+    tarjetas = driver.execute_script("""
+        return Array.prototype.map.call(
+            document.querySelectorAll('.row.mode1 .dir1'),
+            function (tarjeta) {
+                var enlace = tarjeta.querySelector('h5.card-title a');
+                return {url: enlace ? enlace.href : null, texto: tarjeta.innerText || ''};
+            }
+        );
+    """) or []
+    return [crear_tarjeta(tarjeta["url"], tarjeta["texto"]) for tarjeta in tarjetas if tarjeta.get("url")]
+
+def agregar_a_frontera(frontera, slugs_vistos, urls):
+    """Añade a la frontera los animes no vistos antes y devuelve cuántos se añadieron"""
+    nuevos = 0
+    for url in urls:
+        if not url:
+            continue
+        slug = obtener_slug(url)
+        if slug in slugs_vistos:
+            continue
+        slugs_vistos.add(slug)
+        frontera.append((slug, url))
+        nuevos += 1
+    return nuevos
+
+def extraer_tarjetas_directorio_html(html_pagina):
+    """Extrae las tarjetas del directorio (URL, episodios, estado) del HTML crudo de un listado"""
+    # Cada tarjeta va desde su <div class="... dir1"> hasta el comienzo de la siguiente
+    inicios = [coincidencia.start() for coincidencia in PATRON_TARJETA.finditer(html_pagina)]
+    if inicios:
+        bloques = [html_pagina[inicio:fin] for inicio, fin in zip(inicios, inicios[1:] + [len(html_pagina)])]
+    else:
+        bloques = [html_pagina]
+    
+    tarjetas = []
+    for bloque in bloques:
+        titulos = PATRON_TITULO_TARJETA.findall(bloque)
+        if not titulos:
+            continue
+        url = urljoin(URL_DIRECTORIO, unescape(titulos[0]))
+        if len(titulos) > 1:
+            # Sin separadores de tarjeta fiables: solo se pueden sacar las URLs
+            tarjetas.extend(crear_tarjeta(urljoin(URL_DIRECTORIO, unescape(t)), "") for t in titulos)
+            continue
+        texto = unescape(PATRON_ETIQUETA_HTML.sub(" ", bloque))
+        tarjetas.append(crear_tarjeta(url, texto))
+    return tarjetas
+
+# Enlaces de la paginación del directorio: <a class="page-numbers" href=".../directorio/?p=N">
+PATRON_ENLACE_PAGINACION = re.compile(r'<a\b[^>]*\bpage-numbers\b[^>]*>', re.IGNORECASE)
+PATRON_PAGINA_DIRECTORIO = re.compile(
+    r'href=["\'][^"\']*/directorio/?\?(?:[^"\']*?(?:&|&amp;))?p=(\d+)', re.IGNORECASE
+)
+
+def obtener_ultima_pagina_directorio(html_pagina):
+    """Devuelve el número de la última página enlazada en la paginación del directorio.
+    
+    Solo cuenta los enlaces .page-numbers que apuntan a /directorio/, así un p=N de
+    cualquier otro script o URL de la página no dispara miles de páginas inexistentes.
+    """
+    numeros = [
+        int(coincidencia.group(1))
+        for enlace in PATRON_ENLACE_PAGINACION.findall(html_pagina or "")
+        for coincidencia in [PATRON_PAGINA_DIRECTORIO.search(enlace)]
+        if coincidencia
+    ]
+    return max(numeros, default=1)
+
+def descubrir_directorio_http(num_hilos=NUM_HILOS_DIRECTORIO, punto_control=None):
+    """Descarga en paralelo todas las páginas /directorio/?p=N y devuelve las tarjetas de sus animes.
+    
+    Lee la primera página para conocer el número de la última y pide el resto
+    de forma concurrente. Devuelve None si el HTML no trae las tarjetas, en cuyo
+    caso hay que recorrer el directorio con Chrome. Con punto de control, las
+    páginas ya leídas en una ejecución anterior no se vuelven a descargar.
+    """
+    tarjetas_por_pagina = punto_control.paginas_guardadas() if punto_control else {}
+    ultima_guardada = punto_control.obtener_meta("ultima_pagina_http") if punto_control else None
+    
+    if 1 in tarjetas_por_pagina and ultima_guardada:
+        ultima_pagina = int(ultima_guardada)
+        print(f"[DEBUG] Reanudando el directorio: {len(tarjetas_por_pagina)} de {ultima_pagina} páginas ya leídas")
+    else:
+        print(f"[DEBUG] Descubriendo el directorio por HTTP: {URL_DIRECTORIO}")
+        html_inicial = descargar_html(URL_DIRECTORIO)
+        if not html_inicial:
+            return None
+        
+        tarjetas_primera = extraer_tarjetas_directorio_html(html_inicial)
+        if not tarjetas_primera:
+            print("[DEBUG] El HTML del directorio no contiene tarjetas de anime, se usará Chrome")
+            return None
+        
+        ultima_pagina = obtener_ultima_pagina_directorio(html_inicial)
+        tarjetas_por_pagina[1] = tarjetas_primera
+        if punto_control:
+            punto_control.guardar_pagina(1, tarjetas_primera)
+            punto_control.guardar_meta("ultima_pagina_http", ultima_pagina)
+    
+    def guardar(pagina, html_pagina):
+        tarjetas_por_pagina[pagina] = extraer_tarjetas_directorio_html(html_pagina)
+        if punto_control:
+            punto_control.guardar_pagina(pagina, tarjetas_por_pagina[pagina])
+    
+    faltantes = [pagina for pagina in range(2, ultima_pagina + 1) if pagina not in tarjetas_por_pagina]
+    print(f"[DEBUG] El directorio tiene {ultima_pagina} páginas. Descargando {len(faltantes)} con {num_hilos} hilos...")
+    
+    paginas_fallidas = []
+    with ThreadPoolExecutor(max_workers=num_hilos) as executor:
+        futuros = {
+            executor.submit(descargar_html, f"{URL_DIRECTORIO}?p={pagina}"): pagina
+            for pagina in faltantes
+        }
+        for futuro in as_completed(futuros):
+            pagina = futuros[futuro]
+            html_pagina = futuro.result()
+            if html_pagina is None:
+                paginas_fallidas.append(pagina)
+                continue
+            guardar(pagina, html_pagina)
+            print(f"[DEBUG] Página {pagina}: {len(tarjetas_por_pagina[pagina])} animes")
+    
+    # Reintentar una vez, en serie, las páginas que fallaron
+    for pagina in sorted(paginas_fallidas):
+        html_pagina = descargar_html(f"{URL_DIRECTORIO}?p={pagina}")
+        if html_pagina is None:
+            print(f"[ERROR] No se pudo descargar la página {pagina} del directorio")
+            continue
+        guardar(pagina, html_pagina)
+    
+    # Mantener el orden del directorio
+    tarjetas = [tarjeta for pagina in sorted(tarjetas_por_pagina) for tarjeta in tarjetas_por_pagina[pagina]]
+    print(f"[DEBUG] Descubiertos {len(tarjetas)} animes en {len(tarjetas_por_pagina)} páginas")
+    return tarjetas
+
+class NavegadorBajoDemanda:
+    """Envuelve un navegador que solo se arranca la primera vez que se usa.
+    
+    Los hilos de episodios van por HTTP y casi nunca necesitan Chrome; así no
+    pagan su arranque salvo que alguna página lo requiera.
+    """
+    def __init__(self):
+        self.driver = None
+    
+    def __getattr__(self, nombre):
+        if self.driver is None:
+            self.driver = crear_driver()
+        return getattr(self.driver, nombre)
+    
+    def quit(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+class PipelineImportacion:
+    """Importa animes por etapas conectadas con colas acotadas.
+    
+    descubrimiento -> detalle -> episodios -> persistencia
+                                          `-> imágenes (segundo plano) -> persistencia
+    
+    Quien lo usa hace el descubrimiento y deja (slug, url) con encolar_anime(). La
+    etapa de detalle abre la ficha, crea el anime con sus temporadas y episodios y
+    reparte los episodios; la de episodios extrae los reproductores, entrega cada
+    episodio al EscritorBD, que persiste, y deja su imagen al DescargadorImagenes, que
+    al terminar la descarga avisa al escritor para cambiar el still_path.
+    Cada etapa tiene sus propios hilos (HILOS_POR_ETAPA), así se puede escalar la más
+    lenta sin multiplicar las demás, y una cola llena hace esperar a la anterior.
+    """
+    ETAPAS = ("detalle", "episodios")
+    
+    def __init__(self, slugs_conocidos, hilos=None, tamano_cola=TAMANO_COLA_ETAPA, punto_control=None,
+                 al_revisar=None):
+        self.slugs_conocidos = slugs_conocidos
+        self.punto_control = punto_control
+        # al_revisar(slug, episodios_por_extraer) se llama cada vez que la etapa de
+        # detalle termina de crear o actualizar un anime
+        self.al_revisar = al_revisar
+        self.hilos_por_etapa = dict(HILOS_POR_ETAPA, **(hilos or {}))
+        self.colas = {etapa: queue.Queue(maxsize=tamano_cola) for etapa in self.ETAPAS}
+        self.hilos = {etapa: [] for etapa in self.ETAPAS}
+        self.escritor = EscritorBD(al_confirmar=self.episodios_confirmados)
+        self.descargador = None
+        
+        # Progreso de cada anime: episodios que faltan por confirmar en la BD
+        self.lock = threading.Lock()
+        self.episodios_pendientes = {}
+        self.anime_de_episodio = {}
+        # Animes en marcha con algún episodio que se quedó sin videos
+        self.animes_incompletos = set()
+        # Slugs en la cola de detalle o procesándose en ella: uno solo a la vez por anime
+        self.en_proceso = set()
+        self.estadisticas = {"agregados": 0, "actualizados": 0, "completados": 0, "episodios": 0}
+    
+    def iniciar(self):
+        """Arranca el escritor, el descargador y los hilos de cada etapa, de la última a la primera"""
+        self.escritor.iniciar()
+        self.descargador = DescargadorImagenes(self.hilos_por_etapa["imagenes"])
+        destinos = {
+            "detalle": self.etapa_detalle,
+            "episodios": self.etapa_episodios,
+        }
+        for etapa in reversed(self.ETAPAS):
+            for id_hilo in range(1, max(1, self.hilos_por_etapa[etapa]) + 1):
+                hilo = threading.Thread(
+                    target=destinos[etapa],
+                    args=(id_hilo,),
+                    name=f"{etapa}-{id_hilo}",
+                    daemon=True
+                )
+                hilo.start()
+                self.hilos[etapa].append(hilo)
+        print("[DEBUG] Pipeline iniciado: " + ", ".join(
+            f"{etapa}={len(self.hilos[etapa])}" for etapa in self.ETAPAS
+        ) + f", imagenes={max(1, self.hilos_por_etapa['imagenes'])}")
+    
+    def encolar_anime(self, slug, url, actualizar=False, total_episodios=None):
+        """Entrega un anime a la etapa de detalle (bloquea si la cola está llena).
+        
+        Con actualizar=True el anime ya está en la BD y solo se buscan episodios nuevos;
+        si además se da total_episodios (p. ej. el número de la portada) no se abre la ficha.
+        Un slug que ya está en la etapa de detalle no se vuelve a encolar y devuelve False:
+        así el directorio, el sondeo y la agenda nunca crean ni amplían dos veces el mismo anime.
+        """
+        with self.lock:
+            if slug in self.en_proceso:
+                print(f"[DEBUG] '{slug}' ya está en la etapa de detalle, no se encola otra vez")
+                return False
+            self.en_proceso.add(slug)
+        self.colas["detalle"].put((slug, url, actualizar, total_episodios))
+        return True
+    
+    def encolar_episodios(self, contexto_anime, episodios_ids):
+        """Registra un anime ya creado y entrega sus episodios a la etapa de episodios.
         
+        Los episodios que ya están en marcha en el pipeline no se vuelven a encolar.
+        Devuelve cuántos se encolaron.
+        """
+        nuevos = self.registrar_anime(contexto_anime, episodios_ids)
+        for ep_num in sorted(nuevos):
+            self.colas["episodios"].put((contexto_anime, ep_num, nuevos[ep_num]))
+        return len(nuevos)
+    
+    def reanudar(self, cursor):
+        """Vuelve a poner en marcha los animes que el punto de control dejó a medias.
+        
+        Devuelve los slugs reanudados, para que el descubrimiento no los vuelva a encolar.
+        """
+        if not self.punto_control:
+            return []
+        en_curso = self.punto_control.animes_en_curso()
+        for slug, url in en_curso:
+            contexto_anime = obtener_anime_por_slug(cursor, slug)
+            if contexto_anime is None:
+                # Se cayó antes de confirmar el anime: hay que empezarlo de nuevo
+                print(f"[DEBUG] Reanudando '{slug}' desde la ficha del anime")
+                self.encolar_anime(slug, url)
+                continue
+            
+            self.punto_control.anime_en_curso(slug, url, contexto_anime['id'])
+            pendientes = obtener_episodios_sin_videos(cursor, contexto_anime['id'])
+            print(f"[DEBUG] Reanudando '{slug}' (ID {contexto_anime['id']}): {len(pendientes)} episodios pendientes")
+            self.encolar_episodios(contexto_anime, pendientes)
+        return [slug for slug, _ in en_curso]
+    
+    def cerrar(self):
+        """Vacía las etapas en orden y espera a que todo quede escrito en la BD"""
+        for etapa in self.ETAPAS:
+            for _ in self.hilos[etapa]:
+                self.colas[etapa].put(None)
+            for hilo in self.hilos[etapa]:
+                hilo.join()
+        # Las descargas pendientes aún tienen que avisar al escritor
+        self.descargador.cerrar()
+        self.escritor.detener()
+        
+        if self.episodios_pendientes:
+            print(f"[AVISO] {len(self.episodios_pendientes)} animes quedaron con episodios sin escribir: "
+                  f"{sorted(self.episodios_pendientes)}")
+    
+    def etapa_detalle(self, id_hilo):
+        """Abre la ficha de cada anime, lo crea o actualiza en la BD y reparte sus episodios"""
+        driver = NavegadorBajoDemanda()
         try:
-            driver.quit()
-            print("[DEBUG] Navegador cerrado correctamente")
-        except Exception as e:
-            print(f"[ERROR] Error al cerrar el navegador: {e}")
+            while True:
+                item = self.colas["detalle"].get()
+                if item is None:
+                    # Señal de fin: no quedan más animes por procesar
+                    break
+                
+                slug, url, actualizar, total_episodios = item
+                try:
+                    print(f"[DETALLE {id_hilo}] Extrayendo detalles del anime: {url}")
+                    if actualizar:
+                        self.actualizar_anime(driver, slug, url, total_episodios)
+                    else:
+                        self.crear_anime(driver, slug, url)
+                except Exception as e:
+                    print(f"[ERROR] [DETALLE {id_hilo}] Error al procesar el anime {slug}: {e}")
+                    print(f"[ERROR] Traceback: {traceback.format_exc()}")
+                finally:
+                    with self.lock:
+                        self.en_proceso.discard(slug)
+        finally:
+            cerrar_recursos(None, None, driver)
+    
+    def crear_anime(self, driver, slug, url):
+        datos_anime = extraer_detalle_anime(driver, url, slug)
+        if not datos_anime:
+            return
+        
+        if self.punto_control:
+            self.punto_control.anime_en_curso(slug, url)
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        try:
+            contexto_anime, episodios_ids = crear_anime_en_bd(conn, cursor, datos_anime)
+        finally:
+            # La conexión se devuelve antes de repartir, que puede bloquear
+            devolver_conexion(conn, cursor)
+        
+        self.slugs_conocidos.agregar(slug)
+        with self.lock:
+            self.estadisticas["agregados"] += 1
+        if self.al_revisar:
+            # La primera importación no cuenta como episodios nuevos para la agenda
+            self.al_revisar(slug, 0)
+        if self.punto_control:
+            self.punto_control.anime_en_curso(slug, url, contexto_anime['id'])
+        self.encolar_episodios(contexto_anime, episodios_ids)
+    
+    def actualizar_anime(self, driver, slug, url, total_episodios=None):
+        if total_episodios is None:
+            datos_anime = extraer_detalle_anime(driver, url, slug, descargar_poster=False)
+            if not datos_anime:
+                return
+            total_episodios = datos_anime['total_episodios']
+        
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        try:
+            contexto_anime = obtener_anime_por_slug(cursor, slug)
+            if contexto_anime is None:
+                print(f"[AVISO] '{slug}' no está en la BD, no se puede actualizar")
+                return
+            pendientes = actualizar_estructura_anime(conn, cursor, contexto_anime, total_episodios)
+        finally:
+            devolver_conexion(conn, cursor)
+        
+        if self.al_revisar:
+            self.al_revisar(slug, len(pendientes))
+        if not pendientes:
+            return
+        with self.lock:
+            self.estadisticas["actualizados"] += 1
+        if self.punto_control:
+            self.punto_control.anime_en_curso(slug, url, contexto_anime['id'])
+        self.encolar_episodios(contexto_anime, pendientes)
+    
+    def etapa_episodios(self, id_hilo):
+        """Extrae los reproductores de cada episodio, lo entrega al escritor y encarga su imagen"""
+        driver = NavegadorBajoDemanda()
+        try:
+            while True:
+                item = self.colas["episodios"].get()
+                if item is None:
+                    break
+                
+                contexto_anime, ep_num, episodio_id = item
+                try:
+                    datos_episodio = extraer_datos_episodio(
+                        driver, contexto_anime['url_base'], ep_num, episodio_id, contexto_anime['slug']
+                    )
+                    # El episodio se guarda ya con la URL original; la copia local llega después
+                    self.escritor.encolar(episodio_id, datos_episodio)
+                    if datos_episodio.get("imagen_origen"):
+                        self.descargador.enviar(
+                            datos_episodio["imagen_origen"], contexto_anime['slug'], tipo="chapter", episodio=ep_num,
+                            al_terminar=lambda imagen, episodio_id=episodio_id: self.escritor.encolar_imagen(episodio_id, imagen)
+                        )
+                except Exception as e:
+                    print(f"[ERROR] [EPISODIOS {id_hilo}] Error en el episodio {ep_num} de {contexto_anime['slug']}: {e}")
+        finally:
+            cerrar_recursos(None, None, driver)
+    
+    def registrar_anime(self, contexto_anime, episodios_ids):
+        """Apunta los episodios del anime como pendientes y devuelve los que no lo estaban ya"""
+        anime_id = contexto_anime['id']
+        with self.lock:
+            nuevos = {
+                ep_num: episodio_id for ep_num, episodio_id in episodios_ids.items()
+                if episodio_id not in self.anime_de_episodio
+            }
+            if nuevos:
+                self.episodios_pendientes[anime_id] = self.episodios_pendientes.get(anime_id, 0) + len(nuevos)
+                for episodio_id in nuevos.values():
+                    self.anime_de_episodio[episodio_id] = anime_id
+            en_marcha = anime_id in self.episodios_pendientes
+            if not en_marcha:
+                self.estadisticas["completados"] += 1
+        if not en_marcha and self.punto_control:
+            self.punto_control.anime_completo(anime_id)
+        return nuevos
+    
+    def episodios_confirmados(self, episodios):
+        """Lo llama el escritor tras cada commit; cierra los animes ya completos.
+        
+        Un episodio cuya extracción falló llega sin reproductores, y uno que el escritor no
+        pudo guardar llega sin datos; ninguno deja videos en la BD:
+        sale del pipeline (se podrá volver a encolar), pero su anime no se da por completo y
+        sigue en curso en el punto de control para reanudarlo.
+        """
+        completos = []
+        with self.lock:
+            for episodio_id, datos_episodio in episodios:
+                anime_id = self.anime_de_episodio.pop(episodio_id, None)
+                if anime_id is None:
+                    continue
+                if datos_episodio and datos_episodio.get("reproductores"):
+                    self.estadisticas["episodios"] += 1
+                else:
+                    self.animes_incompletos.add(anime_id)
+                self.episodios_pendientes[anime_id] -= 1
+                if self.episodios_pendientes[anime_id] > 0:
+                    continue
+                del self.episodios_pendientes[anime_id]
+                if anime_id in self.animes_incompletos:
+                    self.animes_incompletos.discard(anime_id)
+                    print(f"[AVISO] Anime ID {anime_id}: quedan episodios sin videos, sigue en curso")
+                    continue
+                self.estadisticas["completados"] += 1
+                completos.append(anime_id)
+                print(f"[✅ COMPLETADO] Anime ID {anime_id}: todos sus episodios están en la BD")
+        
+        if self.punto_control:
+            for anime_id in completos:
+                self.punto_control.anime_completo(anime_id)
+
+def encolar_frontera(frontera, slugs_conocidos, cursor, pipeline):
+    """Vacía la frontera encolando para la etapa de detalle los animes que no están en la BD.
+    
+    Devuelve (animes_encolados, animes_existentes).
+    """
+    animes_encolados = 0
+    animes_existentes = 0
+    while frontera:
+        slug, url = frontera.popleft()
+        try:
+            print(f"[DEBUG] URL: {url}")
+            print(f"[🔗 URL] ANIME: {url}")  # URL destacada
+            print(f"[DEBUG] Slug: {slug}")
             
-        print("[DEBUG] Proceso completado")
+            # Verificar si el anime ya existe en la base de datos (en memoria)
+            if slugs_conocidos.contiene(slug, cursor):
+                print(f"[DEBUG] El anime con slug '{slug}' ya existe en la base de datos. Saltando...")
+                animes_existentes += 1
+                continue
+            
+            # Si no existe, dejarlo en la cola de la etapa de detalle
+            if not pipeline.encolar_anime(slug, url):
+                continue
+            animes_encolados += 1
+            print(f"[DEBUG] Anime '{slug}' encolado ({pipeline.colas['detalle'].qsize()} pendientes en la cola)")
+            
+        except Exception as e:
+            print(f"[ERROR] Error al procesar un anime: {e}")
+            print(f"[ERROR] Traceback: {traceback.format_exc()}")
+    
+    return animes_encolados, animes_existentes
+
+def paginas_directorio_chrome(driver, pagina_actual=1):
+    """Recorre el directorio con el navegador desde la página indicada.
+    
+    Va devolviendo (página, tarjetas, es_la_última) y pasa a la siguiente con el botón
+    de paginación cuando quien consume pide la página siguiente.
+    """
+    print(f"[DEBUG] Iniciando navegación a la página {pagina_actual} del directorio de JKAnime...")
+    navegar(driver, URL_DIRECTORIO if pagina_actual == 1 else f"{URL_DIRECTORIO}?p={pagina_actual}")
+    
+    while True:
+        print(f"[DEBUG] Procesando página {pagina_actual}")
+        
+        # Esperar a que los elementos estén disponibles
+        primer_anime = esperar_condicion(
+            driver,
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".row.mode1 .dir1")),
+            TIMEOUT_DIRECTORIO,
+            "directorio"
+        )
+        if not primer_anime:
+            print(f"[ERROR] La página {pagina_actual} del directorio no cargó ningún anime")
+            return
+        
+        # Recoger en una sola pasada todas las tarjetas del listado
+        tarjetas = extraer_tarjetas_directorio(driver)
+        siguiente_botones = driver.find_elements(By.CSS_SELECTOR, "a.next.page-numbers")
+        yield pagina_actual, tarjetas, not siguiente_botones
+        
+        if not siguiente_botones:
+            print("[DEBUG] No hay más páginas. Terminando.")
+            return
+        
+        # Intentar ir a la siguiente página
+        try:
+            print(f"[DEBUG] Pasando a la página {pagina_actual + 1}")
+            limitador.adquirir(driver.current_url)
+            siguiente_botones[0].click()
+            pagina_actual += 1
+            # Esperar a que el listado anterior desaparezca antes de leer el nuevo
+            esperar_condicion(driver, EC.staleness_of(primer_anime), TIMEOUT_DIRECTORIO, "directorio")
+        except Exception as e:
+            print(f"[ERROR] Error al intentar pasar a la siguiente página: {e}")
+            return
+
+def recorrer_directorio_chrome(driver, frontera, slugs_vistos, slugs_conocidos, cursor, pipeline, punto_control=None):
+    """Recorre el directorio página a página con el navegador (cuando el HTML no trae las tarjetas).
+    
+    Con punto de control continúa desde la página siguiente a la última leída.
+    Devuelve (animes_encolados, animes_existentes).
+    """
+    animes_encolados = 0
+    animes_existentes = 0
+    pagina_actual = 1
+    
+    guardadas = punto_control.paginas_guardadas() if punto_control else {}
+    if guardadas:
+        # Los animes de las páginas ya leídas vuelven a la frontera; los existentes se saltan
+        for pagina in sorted(guardadas):
+            agregar_a_frontera(frontera, slugs_vistos, [tarjeta["url"] for tarjeta in guardadas[pagina]])
+        animes_encolados, animes_existentes = encolar_frontera(frontera, slugs_conocidos, cursor, pipeline)
+        
+        ultima_pagina = punto_control.obtener_meta("ultima_pagina_chrome")
+        if ultima_pagina and max(guardadas) >= int(ultima_pagina):
+            print("[DEBUG] El directorio ya se había recorrido entero")
+            return animes_encolados, animes_existentes
+        pagina_actual = max(guardadas) + 1
+    
+    for pagina, tarjetas, ultima in paginas_directorio_chrome(driver, pagina_actual):
+        nuevos = agregar_a_frontera(frontera, slugs_vistos, [tarjeta["url"] for tarjeta in tarjetas])
+        print(f"[DEBUG] Se encontraron {len(tarjetas)} animes en la página {pagina} ({nuevos} nuevos en la frontera)")
+        
+        if punto_control:
+            punto_control.guardar_pagina(pagina, tarjetas)
+            if ultima:
+                punto_control.guardar_meta("ultima_pagina_chrome", pagina)
+        
+        # Procesar la frontera sin volver a tocar el listado del navegador
+        encolados, existentes = encolar_frontera(frontera, slugs_conocidos, cursor, pipeline)
+        animes_encolados += encolados
+        animes_existentes += existentes
+    
+    return animes_encolados, animes_existentes
 
-def extraer_animes_jkanime():
+def extraer_animes_jkanime(hilos=None):
+    """Recorre el directorio de JKAnime y pasa los animes nuevos por el pipeline de importación.
+    
+    hilos permite cambiar los hilos de alguna etapa, p. ej. {"episodios": 12}.
+    """
     print("[DEBUG] Iniciando proceso de extracción de animes")
     
     # Configurar la conexión a la base de datos
     conn = None
     cursor = None
+    driver = None
     
     print("[DEBUG] Intentando conectar a la base de datos...")
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="aruma",  # Cambiar por el nombre real de tu base de datos
-            connect_timeout=60    # Aumentar timeout de conexión
-        )
+        conn = conectar_bd()
         print("[DEBUG] Conexión a la base de datos establecida correctamente")
         cursor = conn.cursor()
         print("[DEBUG] Cursor creado correctamente")
+        
+        # Cargar de una vez los slugs que ya están en la base de datos
+        slugs_conocidos = SlugsConocidos(cursor)
     except Exception as e:
         print(f"[ERROR] Error al conectar a la base de datos: {e}")
-        import traceback
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        cerrar_recursos(conn, cursor, None)
         return
     
-    # Configurar opciones de Chrome
-    print("[DEBUG] Configurando opciones de Chrome...")
-    chrome_options = Options()
-    # Se quita el modo headless para que el navegador sea visible
-    # chrome_options.add_argument("--headless") 
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
+    # El descubrimiento se hace aquí; el resto de etapas corre en el pipeline
+    punto_control = PuntoControl()
+    pipeline = PipelineImportacion(slugs_conocidos, hilos, punto_control=punto_control)
+    pipeline.iniciar()
     
-    # Inicializar el navegador Chrome
-    print("[DEBUG] Inicializando navegador Chrome...")
-    try:
-        global driver
-        driver = webdriver.Chrome(options=chrome_options)
-        print("[DEBUG] Navegador Chrome inicializado correctamente")
-    except Exception as e:
-        print(f"[ERROR] Error al inicializar Chrome: {e}")
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}")
-        return
+    # Variables para seguimiento
+    animes_encolados = 0
+    animes_existentes = 0
+    rastreo_completo = False
+    
+    # Frontera de animes por procesar y slugs ya vistos en el directorio
+    frontera = deque()
+    slugs_vistos = set()
     
     try:
-        # Navegar a la página
-        print("[DEBUG] Iniciando navegación a la página de directorio de JKAnime...")
-        driver.get("https://jkanime.org/directorio/")
-        
-        # Esperar 5 segundos como se solicitó
-        print("[DEBUG] Esperando 5 segundos iniciales...")
-        time.sleep(5)
+        # Lo que quedó a medias en la ejecución anterior va primero
+        reanudados = pipeline.reanudar(cursor)
+        slugs_vistos.update(reanudados)
+        if reanudados:
+            print(f"[DEBUG] Reanudados {len(reanudados)} animes del punto de control")
         
         # Extraer información de los animes
         print("[DEBUG] Extrayendo información de animes...")
         
-        # Variables para seguimiento
-        animes_agregados = 0
-        animes_existentes = 0
-        pagina_actual = 1
-        
-        while True:
-            print(f"[DEBUG] Procesando página {pagina_actual}")
-            
-            # Esperar a que los elementos estén disponibles
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".row.mode1 .dir1"))
+        # Primero se intenta descubrir todo el directorio en paralelo por HTTP
+        tarjetas = descubrir_directorio_http(punto_control=punto_control)
+        if tarjetas is not None:
+            nuevos = agregar_a_frontera(frontera, slugs_vistos, [tarjeta["url"] for tarjeta in tarjetas])
+            print(f"[DEBUG] Frontera inicial con {nuevos} animes del directorio")
+            animes_encolados, animes_existentes = encolar_frontera(frontera, slugs_conocidos, cursor, pipeline)
+        else:
+            # Inicializar el navegador Chrome que recorre el directorio
+            print("[DEBUG] Inicializando navegador Chrome para recorrer el directorio...")
+            driver = crear_driver()
+            print("[DEBUG] Navegador Chrome inicializado correctamente")
+            animes_encolados, animes_existentes = recorrer_directorio_chrome(
+                driver, frontera, slugs_vistos, slugs_conocidos, cursor, pipeline, punto_control
             )
-            
-            # Obtener los elementos actuales
-            animes = driver.find_elements(By.CSS_SELECTOR, ".row.mode1 .dir1")
-            print(f"[DEBUG] Se encontraron {len(animes)} animes en la página {pagina_actual}")
-            
-            for index, anime in enumerate(animes):
-                try:
-                    print(f"\n[DEBUG] Procesando anime {index+1} de {len(animes)} en página {pagina_actual}")
-                    
-                    # Volver a recuperar el elemento para evitar stale reference
-                    animes_actualizados = driver.find_elements(By.CSS_SELECTOR, ".row.mode1 .dir1")
-                    if index < len(animes_actualizados):
-                        anime_actual = animes_actualizados[index]
-                    else:
-                        print("[ERROR] Índice de anime fuera de rango después de actualizar la lista")
-                        continue
-                    
-                    # Extraer URL
-                    try:
-                        url_elemento = anime_actual.find_element(By.CSS_SELECTOR, "h5.card-title a")
-                        url = url_elemento.get_attribute("href")
-                    except Exception as e:
-                        print(f"[ERROR] No se pudo extraer la URL: {e}")
-                        continue
-                    
-                    # Obtener el slug de la URL
-                    slug = obtener_slug(url)
-                    print(f"[DEBUG] URL: {url}")
-                    print(f"[🔗 URL] ANIME: {url}")  # URL destacada
-                    print(f"[DEBUG] Slug: {slug}")
-                    
-                    # Verificar si el anime ya existe en la base de datos
-                    if existe_anime_en_bd(cursor, slug):
-                        print(f"[DEBUG] El anime con slug '{slug}' ya existe en la base de datos. Saltando...")
-                        animes_existentes += 1
-                        # Esperar 2 segundos antes de pasar al siguiente anime
-                        print("[DEBUG] Esperando 2 segundos antes de pasar al siguiente anime...")
-                        time.sleep(2)
-                        continue
-                    
-                    # Si no existe, extraer detalles y agregar a la base de datos
-                    print(f"[DEBUG] Extrayendo detalles del anime: {url}")
-                    datos_anime = extraer_detalle_anime(driver, url, slug)
-                    
-                    if datos_anime:
-                        print(f"[DEBUG] Datos extraídos:")
-                        print(f"  - Título: {datos_anime.get('title')}")
-                        print(f"  - Descripción: {datos_anime.get('description')[:50]}...")
-                        print(f"  - ID Trailer: {datos_anime.get('trailer_id')}")
-                        print(f"  - Total Episodios: {datos_anime.get('total_episodios')}")
-                        
-                        insertar_anime_en_bd(conn, cursor, datos_anime)
-                        animes_agregados += 1
-                        print(f"[DEBUG] Anime agregado correctamente. Esperando 10 segundos antes del siguiente anime...")
-                        time.sleep(10)  # Esperar 10 segundos entre cada inserción de anime
-                    
-                    # Volver a la página del directorio
-                    print("[DEBUG] Volviendo a la página del directorio...")
-                    driver.get(f"https://jkanime.org/directorio/?p={pagina_actual}")
-                    time.sleep(5)  # Esperar a que cargue la página
-                    
-                    print("-" * 50)
-                    
-                except Exception as e:
-                    print(f"[ERROR] Error al procesar un anime: {e}")
-                    import traceback
-                    print(f"[ERROR] Traceback: {traceback.format_exc()}")
-                    # Intentar volver a la página del directorio en caso de error
-                    try:
-                        driver.get(f"https://jkanime.org/directorio/?p={pagina_actual}")
-                        time.sleep(5)
-                    except:
-                        pass
-            
-            # Intentar ir a la siguiente página
-            try:
-                # Verificar si hay botón de siguiente página
-                siguiente_botones = driver.find_elements(By.CSS_SELECTOR, "a.next.page-numbers")
-                if len(siguiente_botones) > 0:
-                    print(f"[DEBUG] Pasando a la página {pagina_actual + 1}")
-                    siguiente_botones[0].click()
-                    pagina_actual += 1
-                    time.sleep(5)  # Esperar a que cargue la siguiente página
-                else:
-                    print("[DEBUG] No hay más páginas. Terminando.")
-                    break
-            except Exception as e:
-                print(f"[ERROR] Error al intentar pasar a la siguiente página: {e}")
-                break
+        
+        rastreo_completo = True
+        print("[DEBUG] Directorio recorrido. Esperando a que el pipeline termine...")
+        
+    except Exception as e:
+        print(f"[ERROR] Error general: {e}")
+        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+    finally:
+        # Vaciar las etapas en orden y esperar a que todo quede escrito
+        pipeline.cerrar()
+        
+        # El siguiente rastreo empieza de cero salvo por los animes que sigan a medias
+        # (terminar_rastreo conserva los que están en curso para reanudarlos)
+        if rastreo_completo:
+            punto_control.terminar_rastreo()
+        punto_control.cerrar()
         
         print(f"[DEBUG] Proceso completado.")
-        print(f"[DEBUG] Animes agregados: {animes_agregados}")
+        print(f"[DEBUG] Animes encolados: {animes_encolados}")
+        print(f"[DEBUG] Animes agregados: {pipeline.estadisticas['agregados']}")
+        print(f"[DEBUG] Animes completos: {pipeline.estadisticas['completados']}")
+        print(f"[DEBUG] Episodios escritos: {pipeline.estadisticas['episodios']}")
         print(f"[DEBUG] Animes ya existentes: {animes_existentes}")
         
+        reportar_tiempos_espera()
+        
+        # Cerrar conexiones
+        cerrar_recursos(conn, cursor, driver)
+        print("[DEBUG] Proceso completado")
+
+def actualizar_animes_jkanime(slugs=None, hilos=None):
+    """Busca episodios nuevos de los animes ya importados (de todos si no se indican slugs).
+    
+    Cada anime pasa por el pipeline en modo actualización: se abre su ficha, se compara
+    el total de episodios del sitio con el de la BD y solo se extraen los que faltan.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        if slugs is None:
+            cursor.execute("SELECT slug FROM animes ORDER BY updated_at")
+            slugs = [slug for (slug,) in cursor.fetchall()]
+        slugs_conocidos = SlugsConocidos(cursor)
+    except Exception as e:
+        print(f"[ERROR] Error al conectar a la base de datos: {e}")
+        cerrar_recursos(conn, cursor, None)
+        return
+    
+    print(f"[DEBUG] Buscando episodios nuevos en {len(slugs)} animes")
+    punto_control = PuntoControl()
+    pipeline = PipelineImportacion(slugs_conocidos, hilos, punto_control=punto_control)
+    pipeline.iniciar()
+    try:
+        pipeline.reanudar(cursor)
+        for slug in slugs:
+            pipeline.encolar_anime(slug, f"https://jkanime.org/{slug}", actualizar=True)
     except Exception as e:
         print(f"[ERROR] Error general: {e}")
-        import traceback
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
     finally:
-        # Cerrar conexiones
-        print("[DEBUG] Finalizando proceso, cerrando conexiones...")
-        if cursor:
-            try:
-                cursor.close()
-                print("[DEBUG] Cursor cerrado correctamente")
-            except Exception as e:
-                print(f"[ERROR] Error al cerrar cursor: {e}")
+        pipeline.cerrar()
+        punto_control.cerrar()
         
-        if conn:
+        print(f"[DEBUG] Animes con episodios nuevos: {pipeline.estadisticas['actualizados']}")
+        print(f"[DEBUG] Episodios escritos: {pipeline.estadisticas['episodios']}")
+        
+        reportar_tiempos_espera()
+        cerrar_recursos(conn, cursor, None)
+
+def seleccionar_animes_cambiados(tarjetas, episodios_bd):
+    """Compara las tarjetas del directorio con los episodios de la BD.
+    
+    Devuelve (slugs, sin_datos): los animes ya importados cuya tarjeta anuncia más
+    episodios de los que tenemos (o, si no muestra el número, que siguen en emisión),
+    y cuántas tarjetas no traían ni número ni estado para decidir.
+    """
+    slugs = []
+    vistos = set()
+    sin_datos = 0
+    for tarjeta in tarjetas:
+        slug = obtener_slug(tarjeta["url"])
+        if slug in vistos or slug not in episodios_bd:
+            # Los animes nuevos los importa extraer_animes_jkanime
+            continue
+        vistos.add(slug)
+        
+        if tarjeta["episodios"] is not None:
+            if tarjeta["episodios"] > episodios_bd[slug]:
+                slugs.append(slug)
+        elif tarjeta["estado"] == "emision":
+            slugs.append(slug)
+        elif tarjeta["estado"] is None:
+            sin_datos += 1
+    return slugs, sin_datos
+
+def actualizar_desde_directorio(hilos=None):
+    """Actualiza solo los animes cuya tarjeta del directorio indica episodios nuevos.
+    
+    Lee el listado completo (decenas de páginas), lo compara de una vez con el número
+    de episodios de cada anime en la BD y abre la ficha únicamente de los que cambiaron.
+    """
+    driver = None
+    conn = None
+    cursor = None
+    try:
+        tarjetas = descubrir_directorio_http()
+        if tarjetas is None:
+            driver = crear_driver()
+            tarjetas = [
+                tarjeta
+                for _, tarjetas_pagina, _ in paginas_directorio_chrome(driver)
+                for tarjeta in tarjetas_pagina
+            ]
+        
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        episodios_bd = contar_episodios_por_slug(cursor)
+    except Exception as e:
+        print(f"[ERROR] Error al leer el directorio: {e}")
+        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        return
+    finally:
+        cerrar_recursos(conn, cursor, driver)
+    
+    slugs, sin_datos = seleccionar_animes_cambiados(tarjetas, episodios_bd)
+    print(f"[DEBUG] {len(tarjetas)} tarjetas en el directorio, {len(slugs)} animes con episodios nuevos")
+    if sin_datos:
+        print(f"[AVISO] {sin_datos} tarjetas no muestran episodios ni estado; "
+              f"para revisarlas usa actualizar_animes_jkanime()")
+    if slugs:
+        actualizar_animes_jkanime(slugs, hilos)
+
+# Enlaces /slug/N/ de la portada; las secciones del sitio con la misma forma no son animes
+PATRON_ENLACE_EPISODIO = re.compile(
+    r'href\s*=\s*["\'](?:https?://(?:www\.)?jkanime\.org)?/([a-z0-9][a-z0-9-]*)/(\d+)/?["\']',
+    re.IGNORECASE
+)
+RUTAS_NO_ANIME = {"directorio", "buscar", "genero", "letra", "horario", "top", "tipo", "temporada", "ranking"}
+
+def extraer_ultimos_episodios_html(html_pagina):
+    """Devuelve {slug: último número de episodio} de los enlaces /slug/N/ de un listado"""
+    ultimos = {}
+    for slug, numero in PATRON_ENLACE_EPISODIO.findall(html_pagina or ""):
+        slug = slug.lower()
+        if slug in RUTAS_NO_ANIME:
+            continue
+        ultimos[slug] = max(ultimos.get(slug, 0), int(numero))
+    return ultimos
+
+def obtener_ultimos_episodios(driver):
+    """Lee los últimos episodios publicados, por HTTP y con Chrome si el HTML no los trae"""
+    ultimos = extraer_ultimos_episodios_html(descargar_html(URL_ULTIMOS_EPISODIOS))
+    if not ultimos:
+        print("[DEBUG] El HTML de la portada no trae episodios, se usará Chrome")
+        navegar(driver, URL_ULTIMOS_EPISODIOS)
+        ultimos = extraer_ultimos_episodios_html(driver.page_source)
+    return ultimos
+
+def sondear_ultimos_episodios(intervalo=INTERVALO_SONDEO, hilos=None, ciclos=None):
+    """Revisa cada `intervalo` segundos los últimos episodios publicados y los importa.
+    
+    Cada entrada (slug, N) de la portada se resuelve sin recorrer el directorio: si el
+    anime es nuevo se importa entero por el pipeline; si ya existe se crean los episodios
+    hasta N que falten y solo esos se extraen. Corre hasta Ctrl+C o `ciclos` vueltas.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        slugs_conocidos = SlugsConocidos(cursor)
+    except Exception as e:
+        print(f"[ERROR] Error al conectar a la base de datos: {e}")
+        return
+    finally:
+        devolver_conexion(conn, cursor)
+    
+    punto_control = PuntoControl()
+    pipeline = PipelineImportacion(slugs_conocidos, hilos, punto_control=punto_control)
+    pipeline.iniciar()
+    driver = NavegadorBajoDemanda()
+    
+    # Animes nuevos ya enviados a importar: {slug: momento}. Si tras varias vueltas
+    # siguen sin aparecer en la BD (falló la ficha), se vuelven a intentar.
+    importando = {}
+    ciclo = 0
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        try:
+            pipeline.reanudar(cursor)
+        finally:
+            devolver_conexion(conn, cursor)
+        
+        while ciclos is None or ciclo < ciclos:
+            ciclo += 1
+            inicio = time.time()
             try:
-                conn.close()
-                print("[DEBUG] Conexión a la base de datos cerrada correctamente")
+                sondear_una_vez(driver, pipeline, slugs_conocidos, importando, intervalo)
             except Exception as e:
-                print(f"[ERROR] Error al cerrar conexión a la base de datos: {e}")
+                print(f"[ERROR] Error en el sondeo {ciclo}: {e}")
+                print(f"[ERROR] Traceback: {traceback.format_exc()}")
+            
+            if ciclos is None or ciclo < ciclos:
+                time.sleep(max(0, intervalo - (time.time() - inicio)))
+    except KeyboardInterrupt:
+        print("[INFO] Sondeo detenido por el usuario")
+    finally:
+        pipeline.cerrar()
+        punto_control.cerrar()
+        cerrar_recursos(None, None, driver)
+        reportar_tiempos_espera()
+
+def sondear_una_vez(driver, pipeline, slugs_conocidos, importando, intervalo):
+    """Una vuelta del sondeo: lee la portada y encola lo que falte en la BD.
+    
+    Aquí solo se lee la BD; crear los animes o sus episodios nuevos lo hace la etapa de
+    detalle, que nunca procesa a la vez dos veces el mismo slug.
+    """
+    ultimos = obtener_ultimos_episodios(driver)
+    print(f"[DEBUG] Sondeo: {len(ultimos)} animes en los últimos episodios")
+    
+    nuevos = []
+    con_episodios_nuevos = []
+    conn = conectar_bd()
+    cursor = conn.cursor()
+    try:
+        for slug, numero in ultimos.items():
+            url = f"https://jkanime.org/{slug}"
+            if not slugs_conocidos.contiene(slug, cursor):
+                if time.time() - importando.get(slug, 0) > 6 * intervalo:
+                    importando[slug] = time.time()
+                    nuevos.append((slug, url))
+                continue
+            importando.pop(slug, None)
+            
+            contexto_anime = obtener_anime_por_slug(cursor, slug)
+            if contexto_anime is None:
+                continue
+            ultimo_bd = max(obtener_ids_episodios(cursor, contexto_anime['id']), default=0)
+            if numero > ultimo_bd:
+                con_episodios_nuevos.append((slug, url, numero))
+    finally:
+        # La conexión se devuelve antes de encolar, que puede bloquear
+        devolver_conexion(conn, cursor)
+    
+    encolados = 0
+    for slug, url in nuevos:
+        if pipeline.encolar_anime(slug, url):
+            print(f"[🆕 NUEVO] '{slug}' no está en la BD: se importa completo")
+            encolados += 1
+    
+    actualizados = 0
+    for slug, url, numero in con_episodios_nuevos:
+        # El número de la portada hace de total: la etapa de detalle no abre la ficha
+        if pipeline.encolar_anime(slug, url, actualizar=True, total_episodios=str(numero)):
+            actualizados += 1
+    print(f"[DEBUG] Sondeo: {encolados} animes nuevos, {actualizados} con episodios nuevos encolados")
+
+class Agenda:
+    """Próxima revisión de cada anime para el modo demonio, en un montículo (heapq).
+    
+    Un anime sin revisar nunca tiene la revisión en 0 y sale el primero. Tras cada
+    revisión se reprograma según el estado de su tarjeta del directorio
+    (INTERVALOS_REVISION); si acaba de recibir episodios, esa vez se usa el intervalo de
+    emisión sin cambiar el estado guardado. Se guarda en el punto de control.
+    """
+    
+    def __init__(self, punto_control):
+        self.punto_control = punto_control
+        self.lock = threading.Lock()
+        self.monticulo = []
+        self.proxima = {}
+        self.estados = {}
+        for slug, proxima, estado in punto_control.cargar_agenda():
+            self.proxima[slug] = proxima
+            self.estados[slug] = estado
+            self.monticulo.append((proxima, slug))
+        heapq.heapify(self.monticulo)
+        print(f"[DEBUG] Agenda cargada con {len(self.proxima)} animes")
+    
+    def programar(self, programaciones):
+        """Programa [(slug, momento)]; una entrada anterior del mismo slug queda anulada"""
+        with self.lock:
+            for slug, cuando in programaciones:
+                self.proxima[slug] = cuando
+                heapq.heappush(self.monticulo, (cuando, slug))
+            filas = [(slug, cuando, self.estados.get(slug)) for slug, cuando in programaciones]
+        self.punto_control.guardar_agenda(filas)
+    
+    def agregar_faltantes(self, slugs):
+        """Pone al frente los animes que aún no están en la agenda"""
+        with self.lock:
+            faltantes = [slug for slug in slugs if slug not in self.proxima]
+        self.programar([(slug, 0) for slug in faltantes])
+        return len(faltantes)
+    
+    def actualizar_estados(self, tarjetas):
+        """Toma el estado de emisión que muestran las tarjetas del directorio"""
+        with self.lock:
+            for tarjeta in tarjetas:
+                if tarjeta["estado"]:
+                    self.estados[obtener_slug(tarjeta["url"])] = tarjeta["estado"]
+    
+    def vencidos(self, ahora, limite):
+        """Saca hasta `limite` animes cuya revisión ya toca.
         
+        Quedan reprogramados para INTERVALO_REINTENTO por si la revisión falla;
+        revisado() los reprograma de verdad cuando termina.
+        """
+        slugs = []
+        with self.lock:
+            while self.monticulo and self.monticulo[0][0] <= ahora and len(slugs) < limite:
+                cuando, slug = heapq.heappop(self.monticulo)
+                if self.proxima.get(slug) != cuando:
+                    # Entrada anulada por una reprogramación posterior
+                    continue
+                slugs.append(slug)
+        if slugs:
+            self.programar([(slug, ahora + INTERVALO_REINTENTO) for slug in slugs])
+        return slugs
+    
+    def siguiente(self):
+        """Momento de la próxima revisión pendiente (None si la agenda está vacía)"""
+        with self.lock:
+            return self.monticulo[0][0] if self.monticulo else None
+    
+    def revisado(self, slug, episodios_nuevos):
+        """Callback del pipeline: reprograma el anime según su estado.
+        
+        Los episodios nuevos solo adelantan la próxima revisión; el estado sigue siendo el
+        de la tarjeta del directorio, así un anime finalizado no pasa a revisarse como en emisión.
+        """
+        with self.lock:
+            estado = self.estados.get(slug) or "desconocido"
+        if episodios_nuevos:
+            estado = "emision"
+        self.programar([(slug, time.time() + INTERVALOS_REVISION.get(estado, INTERVALOS_REVISION["desconocido"]))])
+
+def revisar_directorio_demonio(driver, pipeline, slugs_conocidos, agenda):
+    """Relee el directorio: importa los animes nuevos y adelanta los que anuncian episodios"""
+    tarjetas = descubrir_directorio_http()
+    if tarjetas is None:
+        tarjetas = [
+            tarjeta
+            for _, tarjetas_pagina, _ in paginas_directorio_chrome(driver)
+            for tarjeta in tarjetas_pagina
+        ]
+    agenda.actualizar_estados(tarjetas)
+    
+    conn = conectar_bd()
+    cursor = conn.cursor()
+    try:
+        episodios_bd = contar_episodios_por_slug(cursor)
+        frontera = deque()
+        agregar_a_frontera(frontera, set(), [tarjeta["url"] for tarjeta in tarjetas])
+        nuevos = [(slug, url) for slug, url in frontera if not slugs_conocidos.contiene(slug, cursor)]
+    finally:
+        devolver_conexion(conn, cursor)
+    
+    cambiados, _ = seleccionar_animes_cambiados(tarjetas, episodios_bd)
+    agenda.programar([(slug, 0) for slug in cambiados])
+    # encolar_anime descarta los que el sondeo o la agenda ya tienen en la etapa de detalle
+    encolados = sum(1 for slug, url in nuevos if pipeline.encolar_anime(slug, url))
+    print(f"[DEBUG] Directorio: {encolados} animes nuevos, {len(cambiados)} con episodios nuevos")
+
+def ejecutar_demonio(hilos=None):
+    """Modo demonio: mantiene al día todo el catálogo sin relanzar el script.
+    
+    Un mismo pipeline (con sus navegadores ya abiertos) y el pool de conexiones
+    atienden todos los trabajos: la agenda de revisiones por anime, el sondeo de los
+    últimos episodios cada INTERVALO_SONDEO y la relectura del directorio cada
+    INTERVALO_DIRECTORIO_DEMONIO para descubrir animes nuevos. Se detiene con Ctrl+C.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
+        slugs_conocidos = SlugsConocidos(cursor)
+        cursor.execute("SELECT slug FROM animes")
+        slugs_bd = [slug for (slug,) in cursor.fetchall()]
+    except Exception as e:
+        print(f"[ERROR] Error al conectar a la base de datos: {e}")
+        return
+    finally:
+        devolver_conexion(conn, cursor)
+    
+    punto_control = PuntoControl()
+    agenda = Agenda(punto_control)
+    print(f"[DEBUG] {agenda.agregar_faltantes(slugs_bd)} animes nunca revisados en la agenda")
+    
+    pipeline = PipelineImportacion(slugs_conocidos, hilos, punto_control=punto_control, al_revisar=agenda.revisado)
+    pipeline.iniciar()
+    driver = NavegadorBajoDemanda()
+    cola_detalle = pipeline.colas["detalle"]
+    
+    importando = {}
+    proximo_directorio = 0
+    proximo_sondeo = 0
+    try:
+        conn = conectar_bd()
+        cursor = conn.cursor()
         try:
-            driver.quit()
-            print("[DEBUG] Navegador cerrado correctamente")
-        except Exception as e:
-            print(f"[ERROR] Error al cerrar el navegador: {e}")
+            pipeline.reanudar(cursor)
+        finally:
+            devolver_conexion(conn, cursor)
+        
+        while True:
+            ahora = time.time()
+            try:
+                if ahora >= proximo_directorio:
+                    proximo_directorio = ahora + INTERVALO_DIRECTORIO_DEMONIO
+                    revisar_directorio_demonio(driver, pipeline, slugs_conocidos, agenda)
+                if ahora >= proximo_sondeo:
+                    proximo_sondeo = ahora + INTERVALO_SONDEO
+                    sondear_una_vez(driver, pipeline, slugs_conocidos, importando, INTERVALO_SONDEO)
+                
+                # Solo lo que cabe en la cola de detalle, para no bloquear el sondeo
+                libres = cola_detalle.maxsize - cola_detalle.qsize()
+                for slug in agenda.vencidos(time.time(), libres):
+                    pipeline.encolar_anime(slug, f"https://jkanime.org/{slug}", actualizar=True)
+            except Exception as e:
+                print(f"[ERROR] Error en el demonio: {e}")
+                print(f"[ERROR] Traceback: {traceback.format_exc()}")
             
-        print("[DEBUG] Proceso completado")
+            # Dormir hasta el siguiente trabajo, revisando al menos cada 30 segundos
+            # Una revisión vencida en 0 (anime nunca revisado) no es una agenda vacía
+            proxima_revision = agenda.siguiente()
+            siguiente = min(proximo_directorio, proximo_sondeo,
+                            proximo_sondeo if proxima_revision is None else proxima_revision)
+            time.sleep(min(30, max(1, siguiente - time.time())))
+    except KeyboardInterrupt:
+        print("[INFO] Demonio detenido por el usuario")
+    finally:
+        pipeline.cerrar()
+        punto_control.cerrar()
+        cerrar_recursos(None, None, driver)
+        reportar_tiempos_espera()
+
 
 if __name__ == "__main__":
     print("[INICIO] Iniciando script...")
@@ -1122,4 +3410,17 @@ if __name__ == "__main__":
     # Opción 2: Insertar un anime específico por su slug
     # Reemplaza "naruto" con el nombre del anime que quieres insertar
     # Esto insertará el anime con todos sus episodios y reproductores
-    # insertar_anime_por_slug("naruto")
\ No newline at end of file
+    # insertar_anime_por_slug("naruto")
+    
+    # Opción 3: Buscar episodios nuevos de los animes ya importados
+    # actualizar_desde_directorio() solo abre los que cambiaron según el directorio;
+    # actualizar_animes_jkanime() revisa todos (o los slugs indicados)
+    # actualizar_desde_directorio()
+    # actualizar_animes_jkanime()
+    # actualizar_anime_por_slug("one-piece")
+    
+    # Opción 4: Vigilar los últimos episodios publicados cada INTERVALO_SONDEO segundos
+    # sondear_ultimos_episodios()
+    
+    # Opción 5: Modo demonio (agenda por anime + sondeo + directorio), sin relanzar el script
+    # ejecutar_demonio()
\ No newline at end of file